@@ -1,11 +1,19 @@
 # hrbc.py
+import concurrent.futures
 import hashlib
 import json
 import time
-import random
+import determinism
 import requests
+import traceback
 from consensus import Consensus
 from block import Block
+from config import DIFFICULTY_LEVEL, LOAD_HIGH_WATERMARK, LOAD_LOW_WATERMARK, LOAD_REPORT_TTL
+from miner import Miner, meets_difficulty
+from quorum import quorum_size, sign_vote, verify_vote, make_certificate, verify_certificate
+import wire
+import load
+import tracing
 import logging
 
 
@@ -15,25 +23,53 @@ class HRBC(Consensus):
         self.blockchain = blockchain  # Ref to the blockchain object
         self.node_properties = self.initialize_node_properties()
         self.clusters = self.form_clusters()
+        self.node_loads = {}  # node id -> [load, report time], as last sealed into a block
+        self.overloaded = set()  # Nodes passed over for leadership (see apply_loads)
         self.cluster_leaders = self.elect_cluster_leaders()
         self.super_node = self.elect_super_node()
         self.reward = 10
         self.penalty = 20 
         self.decay_rate = 0.01  
+        self.DIFFICULTY = DIFFICULTY_LEVEL
+        self.miner = Miner(self.DIFFICULTY)
 
 
     def initialize_node_properties(self):
         """Randomly initializes properties for each node."""
         node_properties = {}
         for node_id in self.blockchain.reputation_tokens.keys():
+            rng = determinism.shared_rng('properties', node_id)  # Same values on every node in seeded mode
             node_properties[node_id] = {
-                'uptime': random.uniform(0.9, 1.0),  
-                'network_proximity': random.uniform(0.0, 1.0), 
+                'uptime': rng.uniform(0.9, 1.0),  
+                'network_proximity': rng.uniform(0.0, 1.0), 
             }
         logging.debug(f"[HRBC] Node properties initialized: {node_properties}")
         return node_properties
 
 
+    def get_state(self):
+        """Returns the consensus state that is worth carrying in a snapshot."""
+        return {
+            'node_properties': self.node_properties,
+            'clusters': self.clusters,
+            'cluster_leaders': self.cluster_leaders,
+            'super_node': self.super_node,
+            'node_loads': self.node_loads,
+            'overloaded': sorted(self.overloaded),
+        }
+
+    def load_state(self, state):
+        """Restores state produced by get_state (JSON turns cluster ids into strings)."""
+        self.node_properties = state['node_properties']
+        self.clusters = {int(cluster_id): nodes for cluster_id, nodes in state['clusters'].items()}
+        self.cluster_leaders = {int(cluster_id): leader for cluster_id, leader in state['cluster_leaders'].items()}
+        self.super_node = state['super_node']
+        self.node_loads = state.get('node_loads', {})
+        self.overloaded = set(state.get('overloaded', []))
+        logging.debug(f"[HRBC] State restored from snapshot: clusters={self.clusters}, leaders={self.cluster_leaders}")
+
+
+    @tracing.traced('hrbc.initiate_consensus')
     def initiate_consensus(self, blockchain_instance, user_id, last_block, transactions, commitment):
         node_id = blockchain_instance.id
         cluster_id = self.get_cluster_id(node_id)
@@ -48,6 +84,7 @@ class HRBC(Consensus):
                     consensus_result = self.perform_inter_cluster_consensus(blockchain_instance, proposed_block)
                     if consensus_result:
                         self.last_consensus_id = blockchain_instance.id
+                        # The proposer is credited in validate_block when Blockchain.add_block commits the block
                         logging.info(f"[HRBC] Consensus achieved. Block: {proposed_block}") 
                         return proposed_block
                     else:
@@ -84,11 +121,20 @@ class HRBC(Consensus):
 
 
     def elect_cluster_leaders(self):
-        """Elects cluster leaders based on reputation."""
+        """Elects cluster leaders based on reputation, passing over overloaded nodes.
+
+        If every node of a cluster is overloaded the current leader keeps the
+        job, since moving it would not relieve anyone.
+        """
+        previous = getattr(self, 'cluster_leaders', {})
         cluster_leaders = {}
         for cluster_id, nodes in self.clusters.items():
+            available = [node for node in nodes if node not in self.overloaded]
+            if not available and previous.get(cluster_id) in nodes:
+                cluster_leaders[cluster_id] = previous[cluster_id]
+                continue
             # Find max based on blockchain.reputation_tokens scores
-            leader = max(nodes, key=lambda node: self.blockchain.reputation_tokens.get(node, 0))
+            leader = max(available or nodes, key=lambda node: self.blockchain.reputation_tokens.get(node, 0))
             cluster_leaders[cluster_id] = leader
 
         logging.debug(f"[HRBC] Cluster leaders elected: {cluster_leaders}")
@@ -109,30 +155,79 @@ class HRBC(Consensus):
 
     def vote_on_block(self, block):
         """Votes on a block based on simplified validation.""" 
-        is_valid = random.random() < 0.8  # Simulate a validation check (80% success rate)
+        is_valid = determinism.node_rng('vote').random() < 0.8  # Simulate a validation check (80% success rate)
         logging.debug(f"[HRBC] Node {self.blockchain.id} voted {'YES' if is_valid else 'NO'} on block {block.hash}")
         return is_valid  
 
 
+    @tracing.traced('hrbc.validate_block')
     def validate_block(self, blockchain, new_block, consensus_id):
-        """Validates the mined block and updates reputations."""
-        last_block = blockchain.get_last_block()
-        if new_block.previous_hash == last_block.hash and new_block.hash.startswith("0" * 4): 
-            self.update_reputation(blockchain, consensus_id, 1) 
+        """Checks the block's quorum certificate, linkage and proof of work, and updates the proposer's reputation.
+
+        The certificate binds the block hash (which covers the proposer field)
+        to votes signed by the current cluster leaders, so reputation goes to the proposer it names
+        rather than to the unauthenticated sender id. A block without a valid
+        certificate, or that does not extend our tip, is rejected without
+        touching anyone's reputation.
+        """
+        # Only the cluster leaders for this height may vote; the block has not moved the election on yet
+        valid, reason = verify_certificate(new_block.certificate, new_block, set(self.cluster_leaders.values()),
+                                           len(self.cluster_leaders))
+        if not valid:
+            logging.warning(f"[HRBC] Rejecting block {new_block.hash} from {consensus_id}: {reason}")
+            return False
+        if new_block.previous_hash != blockchain.get_last_block().hash:
+            # A competing block at a height we already filled: a race, not misbehaviour. Penalizing it here
+            # would change reputations, and so the leader set, on only the nodes that happened to receive it.
+            logging.info(f"[HRBC] Rejecting block {new_block.hash} from {consensus_id}: it does not extend our tip.")
+            return False
+        if meets_difficulty(new_block.hash, self.DIFFICULTY): 
+            self.update_reputation(blockchain, new_block.proposer, 1) 
             return True
         else:
-            self.update_reputation(blockchain, consensus_id, -1)
+            self.update_reputation(blockchain, new_block.proposer, -1)
             return False
 
 
+    @tracing.traced('hrbc.process_new_block')
     def process_new_block(self, blockchain, new_block):
-        blockchain.chain.append(new_block)
+        blockchain.append_block(new_block)
         logging.info(f"[HRBC Consensus] Block added to blockchain: {new_block}")
         blockchain.update_metrics(new_block)
         self.decay_reputation(blockchain)
+        self.apply_loads(new_block)
+        self.cluster_leaders = self.elect_cluster_leaders()
+        self.super_node = self.elect_super_node()
+
+    def apply_loads(self, block):
+        """Updates the overloaded set from the load reports sealed into a block.
+
+        The reports are covered by the block hash, so every node applies the
+        same ones at the same height and the leader views move together. A
+        node becomes overloaded at LOAD_HIGH_WATERMARK and stays so until a
+        report puts it under LOAD_LOW_WATERMARK, which keeps leadership from
+        flapping around a single threshold. Reports older than LOAD_REPORT_TTL
+        at the block's timestamp are dropped, and with them the overload.
+        """
+        for node_id, (value, reported_at) in (block.loads or {}).items():
+            held = self.node_loads.get(node_id)
+            if held is None or reported_at > held[1]:
+                self.node_loads[node_id] = [value, reported_at]
+        for node_id, (value, reported_at) in list(self.node_loads.items()):
+            if block.timestamp - reported_at > LOAD_REPORT_TTL:
+                del self.node_loads[node_id]
+                self.overloaded.discard(node_id)
+            elif value >= LOAD_HIGH_WATERMARK:
+                if node_id not in self.overloaded:
+                    logging.info(f"[HRBC] {node_id} is overloaded (load {value}); passing it over for leadership.")
+                self.overloaded.add(node_id)
+            elif value <= LOAD_LOW_WATERMARK:
+                self.overloaded.discard(node_id)
 
 
     def update_reputation(self, blockchain, node_id, status):
+        if node_id not in blockchain.reputation_tokens:
+            return  # Blocks fetched during catch-up carry no attributable sender
         if status == 1:
            blockchain.reputation_tokens[node_id] += self.reward # Slow increase, quick to lose
         elif status == -1:
@@ -148,6 +243,7 @@ class HRBC(Consensus):
             blockchain.reputation_tokens[node_id] *= (1 - self.decay_rate) 
 
     
+    @tracing.traced('hrbc.create_block')
     def create_block(self, user_id, previous_hash, transactions, commitment): 
         """Creates a new block."""
         block_data = {
@@ -158,8 +254,24 @@ class HRBC(Consensus):
             'timestamp': time.time(),
             'nonce': 0  
         }
-        new_block = Block(user_id, previous_hash, transactions, commitment, timestamp=block_data['timestamp'], nonce=0) 
+        new_block = Block(user_id, previous_hash, transactions, commitment, timestamp=block_data['timestamp'], nonce=0,
+                          proposer=self.blockchain.id, loads=load.block_loads())
+        with tracing.span('miner.mine', difficulty=self.DIFFICULTY):
+            mined = self.miner.mine(new_block)
+        if not mined:
+            logging.info("[HRBC] Mining stopped before a nonce was found.")
+            return None
         return new_block
+
+    def stop_selection(self, stop_time, previous_hash=None):
+        """Stops an in-progress mining round (another node has been selected).
+
+        With `previous_hash` (the parent of the block that was committed), only
+        a round competing for that same height is stopped; one already building
+        on the new tip keeps going.
+        """
+        if self.miner.stop(previous_hash):
+            logging.info(f"[HRBC] Stopping mining at {stop_time}.")
     
     def get_cluster_id(self, node_id):
         for cluster_id, nodes in self.clusters.items():
@@ -167,42 +279,49 @@ class HRBC(Consensus):
                 return cluster_id
         return None
     
+    @tracing.traced('hrbc.perform_inter_cluster_consensus')
     def perform_inter_cluster_consensus(self, blockchain_instance, proposed_block):
         """Performs inter-cluster consensus using majority voting."""
 
-        positive_votes = 0
         total_cluster_leaders = len(self.cluster_leaders)
-        two_thirds_majority = (2 * total_cluster_leaders) // 3 # calculate the 2/3rd's majority
-
-        #Collect votes from all cluster leaders
-        for cluster_id, leader_id in self.cluster_leaders.items():
-            if leader_id != blockchain_instance.id: 
-                vote = self.request_vote(leader_id, proposed_block)
-                logging.debug(f"[HRBC] Vote received from {leader_id}: {vote}")
-                if vote:
-                    positive_votes += 1
-
-
-        # Check if 2/3rds majority is reached
-        if positive_votes >= two_thirds_majority -1: 
+        proposer = blockchain_instance.id
+        signatures = {proposer: sign_vote(proposed_block.hash)}
+
+        #Collect votes from all cluster leaders in parallel, so the round waits on the slowest healthy leader only
+        voters = [leader_id for leader_id in self.cluster_leaders.values() if leader_id != proposer]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(voters), 1)) as executor:
+            votes = dict(zip(voters, executor.map(tracing.propagate(lambda leader_id: self.request_vote(leader_id, proposed_block)), voters)))
+        for leader_id, (vote, signature) in votes.items():
+            logging.debug(f"[HRBC] Vote received from {leader_id}: {vote}")
+            if vote and verify_vote(leader_id, proposed_block.hash, signature):
+                signatures[leader_id] = signature
+            elif vote:
+                logging.warning(f"[HRBC] Ignoring unauthenticated vote from {leader_id}.")
+
+        # The proposer's own vote counts toward the 2/3 quorum
+        if len(signatures) >= quorum_size(total_cluster_leaders):
+            proposed_block.certificate = make_certificate(proposed_block.hash, signatures, total_cluster_leaders)
             logging.info("[HRBC] Inter-cluster consensus achieved.")
             return True  
         logging.warning("[HRBC] Inter-cluster consensus failed.")
         return False
 
 
+    @tracing.traced('hrbc.request_vote')
     def request_vote(self, node_id, block):
-        """Requests a vote from another cluster leader."""
-        url = f'http://{self.get_node_url(node_id)}/vote_on_block' 
-        data = {'block': block.__dict__}  # Send necessary block information
+        """Requests a vote from another cluster leader. Returns (vote, signature)."""
+        peer = self.get_node_url(node_id)
+        data = {'block': block.to_dict(), 'load': load.local_report()}  # Send necessary block information
         try:
-            response = requests.post(url, json=data, timeout=5) 
-            response.raise_for_status() 
-            return response.json()['vote']
+            response = wire.post(peer, '/vote_on_block', data)
+            response.raise_for_status()
+            body = wire.read_response(peer, response)
+            load.observe_all(body.get('loads'))  # The voter's view of its cluster, sealed into our next block
+            return body['vote'], body.get('signature')
         except requests.exceptions.RequestException as e:
             logging.error(f"[HRBC] Error requesting vote from {node_id}: {e}")
-            logging.debug(traceback.format_exc())  
-            return False 
+            logging.debug(traceback.format_exc())
+            return False, None
 
     def get_node_url(self, node_id):
        """Gets the URL for a given node ID."""
@@ -0,0 +1,70 @@
+# PoA.py
+import time
+from consensus import Consensus
+from block import Block
+import logging
+
+
+class PoA(Consensus):
+    """Proof of Authority baseline.
+
+    The nodes listed in AUTHORIZED_NODES take turns sealing blocks: the block
+    at height h is sealed by authority h mod N, with no mining, voting or
+    reputation. Other nodes (and authorities out of turn) forward their
+    requests to the in-turn authority (see forwarding.leader_for). Followers
+    accept a block if it extends their tip and names the in-turn authority as
+    its proposer, which is checked for blocks fetched during catch-up too.
+    An unreachable authority stalls the chain at its turn. Used as the point
+    of comparison for HRBC in benchmark.py.
+    """
+
+    def __init__(self, blockchain):
+        super().__init__()
+        self.blockchain = blockchain
+        self.authorized_nodes = list(blockchain.authorized_nodes)
+        logging.debug(f"[PoA] Authorized nodes: {self.authorized_nodes}")
+
+    def is_authority(self, node_id):
+        return node_id in self.authorized_nodes
+
+    def in_turn(self, height):
+        """The authority whose turn it is to seal the block at `height`."""
+        if not self.authorized_nodes:
+            return None
+        return self.authorized_nodes[height % len(self.authorized_nodes)]
+
+    def next_sealer(self, blockchain):
+        return self.in_turn(blockchain.get_height() + 1)
+
+    def initiate_consensus(self, blockchain_instance, user_id, last_block, transactions, commitment):
+        sealer = self.next_sealer(blockchain_instance)
+        if sealer != blockchain_instance.id:
+            logging.debug(f"[PoA] It is {sealer}'s turn to seal, not {blockchain_instance.id}'s.")
+            return None
+        new_block = Block(user_id, last_block.hash, transactions, commitment, timestamp=time.time(),
+                          proposer=blockchain_instance.id)
+        logging.info(f"[PoA] Block sealed by {blockchain_instance.id}: {new_block.hash}")
+        return new_block
+
+    def vote_on_block(self, block):
+        """PoA has no voting round; authorities are trusted."""
+        return True
+
+    def validate_block(self, blockchain, new_block, consensus_id):
+        if new_block.previous_hash != blockchain.get_last_block().hash:
+            return False
+        sealer = self.next_sealer(blockchain)
+        if new_block.proposer != sealer:
+            logging.warning(f"[PoA] Rejecting block {new_block.hash}: sealed by {new_block.proposer}, but it is {sealer}'s turn.")
+            return False
+        # Blocks fetched during catch-up carry no sender; the proposer check above still applies to them
+        return consensus_id is None or self.is_authority(consensus_id)
+
+    def process_new_block(self, blockchain, new_block):
+        blockchain.append_block(new_block)
+        logging.info(f"[PoA Consensus] Block added to blockchain: {new_block.hash}")
+        blockchain.update_metrics(new_block)
+
+    def stop_selection(self, stop_time, previous_hash=None):
+        """Nothing to stop: PoA does not mine."""
+        logging.debug(f"[PoA] Ignoring stop request at {stop_time}.")
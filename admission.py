@@ -0,0 +1,123 @@
+# admission.py
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from config import (ADMISSION_RATE, ADMISSION_BURST, ADMISSION_MAX_IN_FLIGHT, ADMISSION_QUEUE_SIZE,
+                    ADMISSION_QUEUE_TIMEOUT, ADMISSION_MAX_CLIENTS)
+
+ADMITTED = 'admitted'
+RATE_LIMITED = 'rate_limited'
+QUEUE_FULL = 'queue_full'
+TIMED_OUT = 'timed_out'
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend one token. Returns 0 on success, otherwise the seconds until a token is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate limits and a bounded FIFO queue in front of the write endpoints.
+
+    Each client (see ADMISSION_CLIENT_HEADER) has a token bucket refilled at
+    ADMISSION_RATE per second up to ADMISSION_BURST. At most
+    ADMISSION_MAX_IN_FLIGHT admitted requests run at once; up to
+    ADMISSION_QUEUE_SIZE more wait for a slot in arrival order, and a finished
+    request hands its slot straight to the oldest waiter. Anything beyond
+    that, or still waiting after ADMISSION_QUEUE_TIMEOUT seconds, is refused
+    with a Retry-After estimate, so a burst costs the excess clients a retry
+    rather than costing everyone a timeout.
+    """
+
+    def __init__(self, rate=ADMISSION_RATE, burst=ADMISSION_BURST, max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+                 max_queue=ADMISSION_QUEUE_SIZE, queue_timeout=ADMISSION_QUEUE_TIMEOUT, max_clients=ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # client -> TokenBucket, least recently seen first
+        self.waiters = deque()
+        self.in_flight = 0
+        self.service_time = None  # EWMA of how long an admitted request holds its slot
+        self.lock = threading.Lock()
+        self.counters = {ADMITTED: 0, RATE_LIMITED: 0, QUEUE_FULL: 0, TIMED_OUT: 0}
+
+    def check_rate(self, client):
+        """Charge `client` one token. Returns 0 if allowed, otherwise seconds until it may retry."""
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            bucket = self.buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self.buckets[client] = bucket
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+            wait = bucket.take()
+            if wait:
+                self.counters[RATE_LIMITED] += 1
+        return wait
+
+    def acquire(self):
+        """Wait for an execution slot. Returns (outcome, retry_after); the caller must release() if admitted."""
+        with self.lock:
+            if self.in_flight < self.max_in_flight and not self.waiters:
+                self.in_flight += 1
+                self.counters[ADMITTED] += 1
+                return ADMITTED, 0
+            if len(self.waiters) >= self.max_queue:
+                self.counters[QUEUE_FULL] += 1
+                return QUEUE_FULL, self.estimated_wait(len(self.waiters))
+            turn = threading.Event()
+            self.waiters.append(turn)
+        if not turn.wait(self.queue_timeout):
+            with self.lock:
+                if not turn.is_set():  # The slot may have been handed over just as the wait ran out
+                    self.waiters.remove(turn)
+                    self.counters[TIMED_OUT] += 1
+                    return TIMED_OUT, self.estimated_wait(len(self.waiters))
+        with self.lock:
+            self.counters[ADMITTED] += 1
+        return ADMITTED, 0
+
+    def release(self, held_for):
+        with self.lock:
+            self.service_time = held_for if self.service_time is None else self.service_time + 0.2 * (held_for - self.service_time)
+            if self.waiters:
+                self.waiters.popleft().set()  # The slot passes directly to the oldest waiter
+            else:
+                self.in_flight -= 1
+
+    def estimated_wait(self, queued):
+        """Seconds until a new arrival behind `queued` waiters would likely get a slot (caller holds the lock)."""
+        return (queued + 1) * (self.service_time or 1.0) / self.max_in_flight
+
+    def queued(self):
+        with self.lock:
+            return len(self.waiters)
+
+    def stats(self):
+        with self.lock:
+            return {'in_flight': self.in_flight, 'queued': len(self.waiters), 'max_in_flight': self.max_in_flight,
+                    'max_queue': self.max_queue, 'clients': len(self.buckets), 'service_time': self.service_time,
+                    **self.counters}
+
+
+def retry_after_header(seconds):
+    """Retry-After takes whole seconds; never advertise less than one."""
+    return str(max(1, math.ceil(seconds)))
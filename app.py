@@ -1,13 +1,29 @@
 # app.py
 
-import sys
-from flask import Flask, request, jsonify
+import argparse
+import hashlib
+import time
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
 from blockchain import Blockchain
-from node_communication import broadcast_block
+from node_communication import relay_block_async
 from zkp import verify_proof, challenge_verifier, issue_token, verify_token
-from config import CURRENT_NODE_URL, DIFFICULTY_LEVEL
+from config import CURRENT_NODE_URL, DIFFICULTY_LEVEL, RANDOM_SEED, TX_LONG_POLL_MAX, ADMISSION_CLIENT_HEADER, TRACEMALLOC_FRAMES
 from block import Block
+import wire
+import peer_health
+import load
+import tracing
+import determinism
+import memory
+from replay import Recorder
+from shards import ShardManager, FORWARD_HEADER
+from forwarding import Forwarder, BatchLog, NotLeader, commit_batch, leader_for, should_forward
+from tx_status import TxTracker
+from admission import AdmissionController, ADMITTED, QUEUE_FULL, retry_after_header
+from events import stream_blocks
+from quorum import sign_vote, load_keys
+from chain_verify import verify_chain
 import logging
 import traceback
 
@@ -25,17 +41,177 @@ logging.basicConfig(
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST"], "allow_headers": "*"}})
 
-# Ensure correct number of arguments
-if len(sys.argv) < 3:
-    logging.error("Usage: python app.py <port> <data_dir>")
-    sys.exit(1)
-
-port = int(sys.argv[1])
-data_dir = sys.argv[2]
+parser = argparse.ArgumentParser(description="Run a single blockchain node.")
+parser.add_argument('port', type=int)
+parser.add_argument('data_dir')
+parser.add_argument('--consensus', default='HRBC',
+                    help="Consensus module/class to load, e.g. HRBC or PoA")
+parser.add_argument('--authorized-nodes', nargs='+', metavar='NODE_ID',
+                    help="Authority node ids for PoA (defaults to AUTHORIZED_NODES in config.py)")
+parser.add_argument('--bootstrap', action='store_true',
+                    help="Restore the latest snapshot from disk and replay the missing tail from peers")
+parser.add_argument('--bootstrap-peer', metavar='HOST:PORT',
+                    help="Also fetch the latest snapshot from this peer and replay the tail from it")
+parser.add_argument('--verify-chain', action='store_true',
+                    help="Verify hashes and links of the chain held at startup before serving: only the genesis block, "
+                         "or with --bootstrap the snapshot anchor and the replayed tail (GET /verify_chain checks a synced node)")
+parser.add_argument('--seed', type=int, default=RANDOM_SEED,
+                    help="Seed reputations, node properties, votes and challenges for reproducible runs")
+parser.add_argument('--sharded', action='store_true',
+                    help="Keep one chain per cluster and route /add_block transactions to shards by user_id hash")
+parser.add_argument('--tracemalloc', action='store_true',
+                    help="Trace Python allocations from startup for /debug/memory (slows allocation down)")
+parser.add_argument('--record', metavar='PATH',
+                    help="Append every inbound client request, with its arrival time, to this JSONL file")
+args = parser.parse_args()
+
+port = args.port
+data_dir = args.data_dir
 
 # Initialize the blockchain with unique node_id and data_dir
 node_id = f'node_{port}'
-blockchain = Blockchain(consensus_algorithm='HRBC', node_id=node_id, data_dir=data_dir)
+tracing.set_process(port, node_id)
+load.set_node(node_id)
+keys_loaded, keys_error = load_keys(data_dir, node_id)
+if not keys_loaded:
+    logging.warning(f"No usable vote keys in {data_dir} ({keys_error}); this node cannot vote or verify votes.")
+shared_seed = None
+if (args.sharded or args.consensus == 'HRBC') and args.seed is None:
+    # Shard routing and HRBC's certificate check (only cluster leaders may vote) need every node to agree on
+    # clusters and leaders; votes, gossip and ZKP challenges stay unseeded
+    logging.warning("No --seed: reputations and node properties use the default shared seed 0 so nodes agree on clusters.")
+    shared_seed = 0
+determinism.configure(args.seed, node_id, shared_seed)
+if args.tracemalloc:
+    memory.start_tracing()
+blockchain = Blockchain(consensus_algorithm=args.consensus, node_id=node_id, data_dir=data_dir,
+                        authorized_nodes=args.authorized_nodes)
+
+if args.bootstrap or args.bootstrap_peer:
+    blockchain.snapshots.bootstrap(args.bootstrap_peer)
+
+if args.verify_chain:
+    # The chain store starts empty on every launch, so there is little to check unless a tail was replayed
+    if blockchain.get_height() == blockchain.base_height:
+        logging.warning("--verify-chain: the node holds a single block at startup; use GET /verify_chain once it has synced.")
+    verify_chain(blockchain)
+
+forwarder = Forwarder(blockchain)
+batch_log = BatchLog()
+load.add_queue_probe(forwarder.queue.qsize)
+tx_tracker = TxTracker()
+admission = AdmissionController()
+load.add_queue_probe(admission.queued)
+shards = ShardManager(blockchain) if args.sharded else None
+if shards:
+    shards.start()
+
+recorder = Recorder(args.record, f"127.0.0.1:{port}") if args.record else None
+
+@app.before_request
+def start_request_trace():
+    # Join the caller's trace if it sent one, otherwise start a new trace here
+    tracing.set_trace_id(request.headers.get(tracing.TRACE_HEADER) or tracing.new_trace_id())
+    g.trace_start = time.time()
+
+@app.after_request
+def end_request_trace(response):
+    response.headers[tracing.TRACE_HEADER] = tracing.current_trace_id()
+    tracing.record(f"{request.method} {request.path}", g.trace_start, time.time() - g.trace_start,
+                   status=response.status_code)
+    return response
+
+@app.before_request
+def record_request():
+    if recorder:
+        recorder.record(request)
+
+# Inter-node endpoints that accept the compact binary wire format
+WIRE_ENDPOINTS = {'receive_block', 'vote_on_block', 'sync_blockchain', 'select_node', 'shard_vote', 'shard_receive_block',
+                  'forward_batch'}
+
+@app.before_request
+def check_wire_format():
+    if request.endpoint in WIRE_ENDPOINTS and not wire.is_supported(request.headers.get('Content-Type')):
+        logging.warning(f"Unsupported Content-Type on /{request.endpoint}: {request.headers.get('Content-Type')}")
+        return jsonify({"message": "Unsupported Media Type", "accept": wire.supported_types()}), 415
+
+# Client write endpoints behind admission control (see admission.py)
+ADMITTED_ENDPOINTS = {'register', 'add_block', 'process_request'}
+
+def client_id():
+    if ADMISSION_CLIENT_HEADER and request.headers.get(ADMISSION_CLIENT_HEADER):
+        return request.headers[ADMISSION_CLIENT_HEADER].split(',')[0].strip()
+    return request.remote_addr
+
+def too_many_requests(message, retry_after):
+    logging.info(f"Refusing {request.method} {request.path} from {client_id()}: {message}.")
+    return jsonify({"message": message, "retry_after": round(retry_after, 3)}), 429, {'Retry-After': retry_after_header(retry_after)}
+
+def is_shard_forward():
+    """A shard forward from a peer, already charged to the client at the entry node. Anyone can send the
+    header, so it only counts in sharded mode and from a peer's address."""
+    if not shards or not request.headers.get(FORWARD_HEADER):
+        return False
+    return request.remote_addr in {peer.rsplit(':', 1)[0] for peer in blockchain.peer_nodes}
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in ADMITTED_ENDPOINTS:
+        return None
+    if not is_shard_forward():
+        wait = admission.check_rate(client_id())
+        if wait:
+            return too_many_requests("Rate limit exceeded", wait)
+    if submits_async():
+        # Async submissions answer at once, so bound the backlog they leave for the batcher instead
+        if forwarder.queue.qsize() >= admission.max_queue:
+            return too_many_requests("Submission backlog full", forwarder.window * forwarder.queue.qsize() / forwarder.batch_size)
+        return None
+    outcome, wait = admission.acquire()
+    if outcome != ADMITTED:
+        return too_many_requests("Server busy" if outcome == QUEUE_FULL else "Timed out waiting for admission", wait)
+    g.admitted_at = time.monotonic()
+
+@app.teardown_request
+def release_admission(exc):
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        admission.release(time.monotonic() - admitted_at)
+
+def wants_async():
+    """Clients opt in with `Prefer: respond-async` or `?async=1`."""
+    return 'respond-async' in request.headers.get('Prefer', '') or request.args.get('async') in ('1', 'true')
+
+# Endpoints that hand async submissions to the batcher; /process_request and sharded /add_block always answer synchronously
+ASYNC_ENDPOINTS = {'register', 'add_block'}
+
+def submits_async():
+    """True if this request will be queued for the batcher and answered at once, rather than run here."""
+    if request.endpoint not in ASYNC_ENDPOINTS or (request.endpoint == 'add_block' and shards):
+        return False
+    return wants_async()
+
+def submit_async(kind, payload):
+    """Admit a submission and answer at once; it is committed in the next batch (see GET /tx/<id>)."""
+    tx_id = tx_tracker.create(kind)
+    forwarder.enqueue(kind, payload, tx_tracker.callback(tx_id))
+    logging.debug(f"Accepted async {kind} submission {tx_id}.")
+    return jsonify({"message": "Accepted", "tx_id": tx_id, "status_url": f"/tx/{tx_id}"}), 202
+
+def commit_or_forward(kind, payload):
+    """Commit one request as a block if this node leads, otherwise through the leader. Returns (body, status).
+
+    Every commit goes through commit_batch, which serializes it with forwarded
+    batches so the leader never builds two blocks on the same tip.
+    """
+    if should_forward(blockchain):
+        logging.debug(f"Forwarding {kind} to the cluster leader.")
+        return forwarder.submit(kind, payload)
+    try:
+        return commit_batch(blockchain, [{'kind': kind, 'payload': payload}])[0]
+    except NotLeader:
+        return forwarder.submit(kind, payload)  # Leadership moved while we waited
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -49,27 +225,19 @@ def register():
             return jsonify({"message": "Invalid input"}), 400  # Bad Request
         
         user_id = data['userId']
-        hashed_password = data['hashedPassword']
 
-        # Check if user is already registered
-        if user_id in blockchain.user_db:
+        # Check if user is already registered (anywhere: register transactions are indexed by every node)
+        if user_id in blockchain.user_commitments:
             logging.warning(f"User {user_id} already registered.")
             return jsonify({"message": "User already registered"}), 400
 
-        # Register the user
-        blockchain.user_db[user_id] = hashed_password
-        logging.info(f"User {user_id} registered successfully.")
+        if submits_async():
+            return submit_async('register', data)
 
-        new_block, consensus_id = blockchain.add_block(user_id, {"action": "register"}, None)
-        logging.debug(new_block)
-
-        if new_block:
-            logging.info(f"New block created: {new_block}")
-            broadcast_block(blockchain.peer_nodes, block=new_block, consensus_id=consensus_id)
-            return jsonify({"message": "Registration successful", "block": new_block.__dict__}), 200
-        else:
-            logging.error("Failed to add registration block.")
-            return jsonify({"message": "Failed to add registration block"}), 500
+        body, status = commit_or_forward('register', data)
+        if status == 200:
+            logging.info(f"User {user_id} registered successfully.")
+        return jsonify(body), status
 
     except Exception as e:
         logging.error(f"Error during registration: {e}")
@@ -84,7 +252,7 @@ def initiate_zkp():
         user_id = data['userId']
         logging.debug(f"Received initiate_zkp data: {data}")
 
-        if user_id not in blockchain.user_db:
+        if user_id not in blockchain.user_commitments:
             logging.warning(f"User {user_id} not registered.")
             return jsonify({"message": "User not registered"}), 404
 
@@ -121,13 +289,12 @@ def verify_zkp():
         node_id = request.host
         logging.debug(f"Received verify_zkp data: {data}")
 
-        if user_id not in blockchain.user_db or user_id + '_T' not in blockchain.user_db:
+        if user_id not in blockchain.user_commitments or user_id + '_T' not in blockchain.user_db:
             logging.warning(f"User {user_id} not registered or commitment not found.")
             return jsonify({"message": "User not registered or commitment not found"}), 404
 
         T = blockchain.user_db[user_id + '_T']
-        H_f = blockchain.user_db[user_id]
-        C = pow(blockchain.g, H_f, blockchain.p)
+        C = blockchain.user_commitments[user_id]  # Public commitment from the on-chain register transaction
 
         if verify_proof(s, T, C, c, blockchain.p, blockchain.g):
             token = issue_token(user_id, node_id)
@@ -196,11 +363,13 @@ def process_request():
                 valid_tokens += 1
 
         if valid_tokens > len(blockchain.peer_nodes) // 2:
-            # Broadcast to other nodes that the request is valid
+            # Record the request on chain and let the other nodes know it is valid
             logging.info(f"Processing request for user {user_id}. Broadcasting to peers.")
-            for node in blockchain.peer_nodes:
-                broadcast_block(node, {"user_id": user_id, "action": "process"}, consensus_id=blockchain.id)
-            return jsonify({"message": "Request processed successfully"}), 200
+            body, status = commit_or_forward('add_block', {'user_id': user_id, 'transaction': {"action": "process", "user_id": user_id},
+                                                           'commitment': None})
+            if status != 200:
+                return jsonify(body), status
+            return jsonify({"message": "Request processed successfully", "tx_ids": body.get('tx_ids')}), 200
         else:
             logging.warning(f"Request denied for user {user_id}. Valid tokens: {valid_tokens}")
             return jsonify({"message": "Request denied"}), 401
@@ -216,42 +385,150 @@ def add_block():
     try:
         block_data = request.get_json()
         user_id = block_data.get('user_id')
-        transaction = block_data.get('transaction')
-        commitment = block_data.get('commitment')
         logging.debug(f"Received add_block data: {block_data}")
 
-        new_block, consensus_id = blockchain.add_block(user_id, transaction, commitment)
-        if new_block:
-            # Broadcast the new block to peer nodes
-            logging.info(f"Adding new block for user {user_id} and broadcasting to peers.")
-            broadcast_block(blockchain.peer_nodes, new_block, consensus_id=consensus_id)
-            return jsonify({"message": "Block added", "block": new_block.__dict__}), 200
-        else:
-            logging.error("Failed to add block.")
-            return jsonify({"message": "Failed to add block"}), 400
+        if shards:
+            return add_shard_block(block_data)
+
+        if submits_async():
+            return submit_async('add_block', block_data)
+
+        body, status = commit_or_forward('add_block', block_data)
+        if status == 200:
+            logging.info(f"Added new block for user {user_id} and broadcast it to peers.")
+        return jsonify(body), status
 
     except Exception as e:
         logging.error(f"Error during Add Block: {e}")
         logging.debug(traceback.format_exc())  # Detailed traceback
         return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
 
+@app.route('/forward_batch', methods=['POST'])
+def forward_batch():
+    logging.debug("Entered /forward_batch endpoint")
+    try:
+        data = wire.read_request(request)
+        load.observe(data.get('load'))
+        # A batch re-sent after a dropped connection is answered from its first delivery, not committed again
+        answer = batch_log.run(data.get('batch_id'), lambda: handle_batch(data))
+        if answer is None:
+            return wire.make_response({"message": "Batch is still being committed"}, 504, request)
+        payload, status = answer
+        return wire.make_response({**payload, "load": load.local_report()}, status, request)
+    except Exception as e:
+        logging.error(f"Error during Forward Batch: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+def handle_batch(data):
+    """Commit a forwarded batch. Returns (response payload, status)."""
+    if should_forward(blockchain):
+        # Our view says someone else leads; tell the follower who, so it can re-route
+        logging.info(f"Batch from {data.get('sender')} arrived, but {leader_for(blockchain)} leads.")
+        return {"message": "Not the cluster leader", "leader": leader_for(blockchain)}, 409
+    try:
+        results = commit_batch(blockchain, data.get('items', []))
+    except NotLeader as e:
+        logging.info(f"Leadership moved to {e.leader} while the batch from {data.get('sender')} was queued.")
+        return {"message": "Not the cluster leader", "leader": e.leader}, 409
+    block_data = next((body.pop('block') for body, status in results if status == 200), None)
+    for body, status in results:
+        body.pop('block', None)  # The block is sent once for the whole batch
+    return {"block": block_data, "results": [{"body": body, "status": status} for body, status in results]}, 200
+
+def add_shard_block(block_data):
+    """Sharded /add_block: commit on the user's shard if we lead it, otherwise forward to its leader."""
+    user_id = block_data.get('user_id')
+    shard_id = shards.shard_for(user_id)
+    if not shards.is_leader(shard_id):
+        if request.headers.get(FORWARD_HEADER):
+            # Already forwarded once; the sender's view of the leaders differs from ours
+            logging.warning(f"Forwarded transaction for shard {shard_id}, but this node does not lead it.")
+            return jsonify({"message": "Not the shard leader", "shard": shard_id}), 503
+        body, status = shards.forward(shard_id, block_data)
+        return jsonify(body), status
+
+    new_block = shards.submit(shard_id, user_id, block_data.get('transaction'), block_data.get('commitment'))
+    if new_block:
+        return jsonify({"message": "Block added", "shard": shard_id, "block": new_block.to_dict(), "tx_ids": new_block.get_merkle_tree().leaves}), 200
+    logging.error(f"Failed to add block to shard {shard_id}.")
+    return jsonify({"message": "Failed to add block", "shard": shard_id}), 400
+
 @app.route('/sync_blockchain', methods=['GET'])
 def sync_blockchain():
     logging.debug("Entered /sync_blockchain endpoint")
     try:
-        chain_data = [block.__dict__ for block in blockchain.chain]
+        chain_data = list(blockchain.iter_block_dicts())
         logging.debug(f"Syncing blockchain data: {chain_data}")
-        return jsonify(chain_data), 200
+        return wire.make_response(chain_data, 200, request)
     except Exception as e:
         logging.error(f"Error during Sync Blockchain: {e}")
         logging.debug(traceback.format_exc())  # Detailed traceback
         return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
 
+@app.route('/headers', methods=['GET'])
+def get_headers():
+    logging.debug("Entered /headers endpoint")
+    try:
+        start = request.args.get('start', default=0, type=int)
+        count = request.args.get('count', default=None, type=int)
+        headers = blockchain.get_headers(start, count)
+        return jsonify({"height": blockchain.get_height(), "headers": headers}), 200
+    except Exception as e:
+        logging.error(f"Error during Get Headers: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/block/<int:height>', methods=['GET'])
+def get_block(height):
+    logging.debug("Entered /block endpoint")
+    try:
+        block = blockchain.get_block(height)
+        if block is None:
+            logging.warning(f"Block at height {height} not found.")
+            return jsonify({"message": "Block not found"}), 404
+        return jsonify(block.to_dict()), 200
+    except Exception as e:
+        logging.error(f"Error during Get Block: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/blocks', methods=['GET'])
+def get_blocks():
+    logging.debug("Entered /blocks endpoint")
+    try:
+        start = request.args.get('start', default=0, type=int)
+        count = request.args.get('count', default=None, type=int)
+        blocks = blockchain.get_blocks(start, count)
+        return jsonify({"height": blockchain.get_height(), "blocks": blocks}), 200
+    except Exception as e:
+        logging.error(f"Error during Get Blocks: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/snapshot/latest', methods=['GET'])
+def get_latest_snapshot():
+    logging.debug("Entered /snapshot/latest endpoint")
+    try:
+        snapshot = blockchain.snapshots.load_latest()
+        if snapshot is None:
+            logging.warning("No snapshot available.")
+            return jsonify({"message": "No snapshot available"}), 404
+        return jsonify(blockchain.snapshots.public(snapshot)), 200
+    except Exception as e:
+        logging.error(f"Error during Get Snapshot: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
 @app.route('/metrics', methods=['GET'])
 def get_metrics():
     logging.debug("Entered /metrics endpoint")
     try:
-        metrics = blockchain.metrics
+        metrics = {**blockchain.get_metrics(), 'network': wire.get_stats(), 'forwarding': forwarder.stats,
+                   'async_submissions': tx_tracker.stats(), 'events': blockchain.block_events.stats(),
+                   'admission': admission.stats(),
+                   'chain_store': {**blockchain.chain.stats(), 'block_index': blockchain.block_index.stats(), 'tx_index': blockchain.tx_index.stats()},
+                   'load': {**load.snapshot(), 'overloaded': sorted(getattr(blockchain.consensus, 'overloaded', []))}}
         logging.debug(f"Returning metrics: {metrics}")
         return jsonify(metrics), 200
     except Exception as e:
@@ -259,31 +536,303 @@ def get_metrics():
         logging.debug(traceback.format_exc())  # Detailed traceback
         return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
 
+@app.route('/verify_chain', methods=['GET'])
+def verify_chain_endpoint():
+    logging.debug("Entered /verify_chain endpoint")
+    try:
+        report = verify_chain(blockchain)
+        return jsonify(report), 200 if report['valid'] else 409
+    except Exception as e:
+        logging.error(f"Error during Verify Chain: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/debug/trace', methods=['GET'])
+def get_trace():
+    logging.debug("Entered /debug/trace endpoint")
+    try:
+        trace_id = request.args.get('trace_id')
+        trace = tracing.export_chrome(trace_id)
+        # Optionally merge in the peers' spans for the same trace to see a whole consensus round
+        if trace_id and request.args.get('include_peers', type=int):
+            for peer in blockchain.peer_nodes:
+                try:
+                    response = wire.get(peer, '/debug/trace', params={'trace_id': trace_id})
+                    response.raise_for_status()
+                    trace['traceEvents'].extend(response.json()['traceEvents'])
+                except Exception as e:
+                    logging.warning(f"Could not fetch trace from {peer}: {e}")
+        return jsonify(trace), 200
+    except Exception as e:
+        logging.error(f"Error during Get Trace: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/debug/memory', methods=['GET'])
+def get_memory():
+    logging.debug("Entered /debug/memory endpoint")
+    try:
+        structures = {
+            **blockchain.memory_structures(),
+            'async_submissions': tx_tracker.records,
+            'admission_clients': admission.buckets,
+            'trace_spans': tracing.buffered_spans(),
+        }
+        if shards:
+            structures.update({f'shard_{shard_id}.chain': chain.chain for shard_id, chain in shards.chains.items()})
+        counts = {
+            'user_db': {'challenge_entries': sum(1 for key in list(blockchain.user_db) if str(key).endswith('_T'))},
+            'issued_tokens': {'tokens': sum(len(tokens) for tokens in list(blockchain.issued_tokens.values()))},
+        }
+        result = memory.report(structures, counts)
+
+        # tracemalloc views, once tracing has been started with --tracemalloc or POST /debug/memory/tracemalloc
+        top = request.args.get('top', type=int)
+        since = request.args.get('diff')
+        if (top or since) and not result['tracemalloc']['tracing']:
+            return jsonify({"message": "tracemalloc is not tracing"}), 409
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({"message": "group_by must be lineno, filename or traceback"}), 400
+        if top:
+            result['top'] = memory.top_allocations(top, group_by)
+        if since:
+            result['diff'] = memory.diff(since, request.args.get('until'), request.args.get('limit', 20, type=int), group_by)
+            if result['diff'] is None:
+                return jsonify({"message": "Unknown snapshot", "snapshots": result['tracemalloc']['snapshots']}), 404
+        return jsonify(result), 200
+    except Exception as e:
+        logging.error(f"Error during Get Memory: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/debug/memory/tracemalloc', methods=['POST'])
+def control_tracemalloc():
+    logging.debug("Entered /debug/memory/tracemalloc endpoint")
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        if action == 'start':
+            memory.start_tracing(int(data.get('frames', TRACEMALLOC_FRAMES)))
+        elif action == 'stop':
+            memory.stop_tracing()
+        elif action == 'snapshot':
+            if not memory.tracemalloc_status()['tracing']:
+                return jsonify({"message": "tracemalloc is not tracing"}), 409
+            label, _ = memory.take_snapshot(data.get('label'))
+            logging.info(f"Took tracemalloc snapshot '{label}'.")
+        else:
+            return jsonify({"message": "action must be start, stop or snapshot"}), 400
+        return jsonify(memory.tracemalloc_status()), 200
+    except Exception as e:
+        logging.error(f"Error during Control Tracemalloc: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/peer_health', methods=['GET'])
+def get_peer_health():
+    logging.debug("Entered /peer_health endpoint")
+    try:
+        return jsonify(peer_health.snapshot()), 200
+    except Exception as e:
+        logging.error(f"Error during Get Peer Health: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Requests are only served once startup (bootstrap, verification) has finished, so answering means ready
+    try:
+        return jsonify({
+            "status": "ready",
+            "node_id": blockchain.id,
+            "height": blockchain.get_height(),
+            "peers": len(blockchain.peer_nodes),
+        }), 200
+    except Exception as e:
+        logging.error(f"Error during Health Check: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"status": "error", "error": str(e)}), 503
+
+@app.route('/shards', methods=['GET'])
+def get_shards():
+    logging.debug("Entered /shards endpoint")
+    try:
+        if not shards:
+            return jsonify({"message": "Sharded mode is not enabled"}), 404
+        return jsonify(shards.status()), 200
+    except Exception as e:
+        logging.error(f"Error during Get Shards: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/shard/<int:shard_id>/tip', methods=['GET'])
+def get_shard_tip(shard_id):
+    logging.debug("Entered /shard/tip endpoint")
+    try:
+        if not shards or shard_id not in shards.chains:
+            return jsonify({"message": "Shard not found"}), 404
+        chain = shards.chains[shard_id]
+        return wire.make_response({"shard_id": shard_id, "height": chain.get_height(), "hash": chain.tip().hash}, 200, request)
+    except Exception as e:
+        logging.error(f"Error during Get Shard Tip: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/shard/<int:shard_id>/blocks', methods=['GET'])
+def get_shard_blocks(shard_id):
+    logging.debug("Entered /shard/blocks endpoint")
+    try:
+        if not shards or shard_id not in shards.chains:
+            return jsonify({"message": "Shard not found"}), 404
+        start = request.args.get('start', default=0, type=int)
+        count = request.args.get('count', default=None, type=int)
+        chain = shards.chains[shard_id]
+        return wire.make_response({"height": chain.get_height(), "blocks": chain.get_blocks(start, count)}, 200, request)
+    except Exception as e:
+        logging.error(f"Error during Get Shard Blocks: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/shard/vote', methods=['POST'])
+def shard_vote():
+    logging.debug("Entered /shard/vote endpoint")
+    try:
+        if not shards:
+            return jsonify({"message": "Sharded mode is not enabled"}), 404
+        data = wire.read_request(request)
+        ballot = shards.vote(int(data['shard_id']), Block.from_dict(data['block']))
+        return wire.make_response(ballot, 200, request)
+    except Exception as e:
+        logging.error(f"Error during Shard Vote: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/shard/receive_block', methods=['POST'])
+def shard_receive_block():
+    logging.debug("Entered /shard/receive_block endpoint")
+    try:
+        if not shards:
+            return jsonify({"message": "Sharded mode is not enabled"}), 404
+        data = wire.read_request(request)
+        block = Block.from_dict(data['block'])
+        status = shards.receive_block(int(data['shard_id']), block, shards.peer_for(block.proposer))
+        if status in (blockchain.BLOCK_ACCEPTED, blockchain.BLOCK_DUPLICATE):
+            return wire.make_response({"message": "Shard block added", "status": status}, 200, request)
+        logging.error(f"Invalid block for shard {data['shard_id']}.")
+        return jsonify({"message": "Invalid shard block"}), 400
+    except Exception as e:
+        logging.error(f"Error during Shard Receive Block: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/events/blocks', methods=['GET'])
+def block_events():
+    logging.debug("Entered /events/blocks endpoint")
+    try:
+        # Resume after the last event the client saw, or from an explicit height
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        from_height = request.args.get('from', default=None, type=int)
+        if from_height is None and last_event_id is not None:
+            from_height = last_event_id + 1
+        stream = stream_blocks(blockchain, blockchain.block_events, from_height)
+        return Response(stream_with_context(stream), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except Exception as e:
+        logging.error(f"Error during Block Events: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/tx/<tx_id>', methods=['GET'])
+def get_tx_status(tx_id):
+    logging.debug("Entered /tx endpoint")
+    try:
+        wait = min(request.args.get('wait', default=0, type=float), TX_LONG_POLL_MAX)
+        record = tx_tracker.get(tx_id, wait)
+        if record is None:
+            # Not an async submission id; it may still be a committed Merkle transaction id
+            location = blockchain.tx_index.get(tx_id)
+            if location is None:
+                return jsonify({"message": "Transaction not found"}), 404
+            return jsonify({"tx_id": tx_id, "status": "committed", "height": location[0]}), 200
+        if record.get('block_hash'):
+            record['height'] = blockchain.block_index.get(record['block_hash'])  # None until the block reaches us
+        return jsonify(record), 200
+    except Exception as e:
+        logging.error(f"Error during Get Transaction Status: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+@app.route('/proof/<tx_id>', methods=['GET'])
+def get_proof(tx_id):
+    logging.debug("Entered /proof endpoint")
+    try:
+        proof = blockchain.get_transaction_proof(tx_id)
+        if proof is None:
+            logging.warning(f"Transaction {tx_id} not found on chain.")
+            return jsonify({"message": "Transaction not found"}), 404
+        logging.debug(f"Returning inclusion proof: {proof}")
+        return jsonify(proof), 200
+    except Exception as e:
+        logging.error(f"Error during Get Proof: {e}")
+        logging.debug(traceback.format_exc())  # Detailed traceback
+        return jsonify({"message": "Internal Server Error", "error": str(e)}), 500
+
+def block_status_response(status, repeated=False):
+    """The /receive_block answer for a receive_block outcome; `repeated` for a delivery answered from the seen-cache."""
+    if status is True or (repeated and status == blockchain.BLOCK_ACCEPTED):
+        status = blockchain.BLOCK_DUPLICATE  # A confirmed Bloom hit means the block is on the chain
+    if status == blockchain.BLOCK_ACCEPTED:
+        return wire.make_response({"message": "Block added successfully", "load": load.local_report()}, 200, request)
+    elif status == blockchain.BLOCK_DUPLICATE:
+        return wire.make_response({"message": "Block already known", "load": load.local_report()}, 200, request)
+    elif status == blockchain.BLOCK_ORPHANED:
+        return wire.make_response({"message": "Block buffered until its parent arrives", "load": load.local_report()}, 202, request)
+    else:
+        return jsonify({"message": "Invalid block"}), 400
+
 @app.route('/receive_block', methods=['POST'])
 def receive_block():
     logging.debug("Entered /receive_block endpoint")
     try:
-        block_data = request.get_json()
+        # Byte-identical redeliveries (retries) are answered from the seen-cache before any parsing.
+        # The cache is keyed on what was actually received, not on any id the sender claims.
+        body_digest = hashlib.sha256(request.get_data()).hexdigest()
+        status = blockchain.seen_blocks.get(body_digest)
+        if status is not None:
+            logging.debug(f"Delivery {body_digest} already seen ({status}).")
+            return block_status_response(status, repeated=True)
+
+        block_data = wire.read_request(request)
         consensus_id = block_data.get('consensus_node')
+        load.observe(block_data.get('load'))
         logging.debug(f"Received block data: {block_data}")
 
-        new_block = Block(
-            block_data['user_id'],
-            block_data['previous_hash'],
-            block_data['transaction'],
-            block_data['commitment'],
-            block_data.get('timestamp'),
-            block_data.get('nonce', 0),
-        )
+        new_block = Block.from_dict(block_data)
         logging.debug(f"Constructed new block: {new_block}")
 
-        if blockchain.consensus.validate_block(blockchain, new_block, consensus_id):
-            blockchain.consensus.process_new_block(blockchain, new_block)
+        # The same block relayed by another node differs in its envelope, but hashes the same
+        status = blockchain.seen_blocks.get(new_block.hash, confirm=blockchain.has_block)
+        if status is not None:
+            logging.debug(f"Block {new_block.hash} already seen ({status}).")
+            blockchain.seen_blocks.add(body_digest, status)
+            return block_status_response(status, repeated=True)
+
+        status = blockchain.receive_block(new_block, consensus_id)
+        # Only on-chain outcomes are keyed by block hash: the certificate is not hashed, so a rejected copy
+        # (e.g. one without a valid certificate) must not shut out the certified block with the same hash
+        if status in (blockchain.BLOCK_ACCEPTED, blockchain.BLOCK_DUPLICATE):
+            blockchain.seen_blocks.add(new_block.hash, status)
+        blockchain.seen_blocks.add(body_digest, status)
+        if status in (blockchain.BLOCK_ACCEPTED, blockchain.BLOCK_ORPHANED):
+            relay_block_async(blockchain, new_block, block_data)
+        if status == blockchain.BLOCK_ACCEPTED:
             logging.info(f"Block added successfully from node {consensus_id}.")
-            return jsonify({"message": "Block added successfully"}), 200
-        else:
+        elif status == blockchain.BLOCK_DUPLICATE:
+            logging.debug(f"Block {new_block.hash} already on chain.")
+        elif status == blockchain.BLOCK_REJECTED:
             logging.error("Invalid block received.")
-            return jsonify({"message": "Invalid block"}), 400
+        return block_status_response(status)
 
     except Exception as e:
         logging.error(f"Error during Receive Block: {e}")
@@ -294,7 +843,7 @@ def receive_block():
 def select_node():
     logging.debug("Entered /select_node endpoint")
     try:
-        data = request.get_json()
+        data = wire.read_request(request)
         node_id = data.get('consensus_id')
         stop_time = data.get('stop_time')
         logging.debug(f"Received select_node data: {data}")
@@ -302,8 +851,8 @@ def select_node():
         if node_id:
             logging.info(f"Received selection completion notification with ID: {node_id}")
             # Implement the logic to stop mining here
-            blockchain.consensus.stop_selection(stop_time)
-            return jsonify({"message": "Mining Stopped"}), 200
+            blockchain.consensus.stop_selection(stop_time, data.get('previous_hash'))
+            return wire.make_response({"message": "Mining Stopped"}, 200, request)
         else:
             logging.warning("No ID provided in select_node request.")
             return jsonify({"error": "No ID provided."}), 400
@@ -325,27 +874,35 @@ from block import Block  # Make sure Block is imported
 @app.route('/vote_on_block', methods=['POST'])
 def vote_on_block():
     try:
-        data = request.get_json()
+        data = wire.read_request(request)
+        load.observe(data.get('load'))
         block_data = data.get('block')
 
         if block_data:
             try:
-                # Exclude 'hash' from block_data before creating Block object
-                block_data_without_hash = block_data.copy()  # Create a copy to avoid modifying original data
-                block_data_without_hash.pop('hash', None)  # Safely remove 'hash' if present
-                
-                block = Block(**block_data_without_hash)
-                
+                # Derived fields such as 'hash' and 'merkle_root' are recomputed by Block
+                block = Block.from_dict(block_data)
+
             except TypeError as e:
-                logging.error(f"Error creating block from JSON: {e}, Block Data: {block_data_without_hash}")
+                logging.error(f"Error creating block from JSON: {e}, Block Data: {block_data}")
                 return jsonify({'error': 'Invalid block data'}), 400
         else:
             logging.error("No 'block' data received in request.")
             return jsonify({'error': 'Invalid request data'}), 400
 
+        # A repeated request gets the ballot already cast, looked up by the hash of the block actually sent
+        ballot = blockchain.seen_votes.get(block.hash)
+        if ballot is not None:
+            logging.debug(f"Repeated vote request for block {block.hash}: {ballot['vote']}")
+            return wire.make_response({**ballot, 'loads': load.fresh_reports()}, 200, request)
+
         vote = blockchain.consensus.vote_on_block(block)
+        # A yes vote is signed so the proposer can put it in the block's quorum certificate
+        ballot = {'vote': vote, 'signature': sign_vote(block.hash) if vote else None}
+        blockchain.seen_votes.add(block.hash, ballot)
         logging.debug(f"Vote requested for block: {block.hash}, Vote: {vote}")
-        return jsonify({'vote': vote}), 200
+        # Our view of everyone's load goes back with the ballot for the proposer to seal into a block
+        return wire.make_response({**ballot, 'loads': load.fresh_reports()}, 200, request)
 
     except Exception as e:
         logging.error(f"Error during voting: {e}", exc_info=True)
@@ -353,7 +910,5 @@ def vote_on_block():
     
 
 if __name__ == '__main__':
-    # Default to port 5000 if no argument is given
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
     logging.info(f"Starting Flask server on port {port}")
     app.run(port=port, debug=True, use_reloader=False)  # Disable reloader for consistent logging
@@ -0,0 +1,153 @@
+# benchmark.py
+
+import argparse
+import concurrent.futures
+import json
+import time
+import requests
+import deploy_nodes
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def get_network_stats(urls):
+    totals = {'messages_sent': 0, 'bytes_sent': 0}
+    for url in urls:
+        try:
+            network = requests.get(f"{url}/metrics", timeout=10).json().get('network', {})
+            for key in totals:
+                totals[key] += network.get(key, 0)
+        except requests.exceptions.RequestException as e:
+            print(f"Could not read metrics from {url}: {e}")
+    return totals
+
+
+def submit(urls, index):
+    """Submit one scripted transaction, trying nodes in turn until one commits it.
+
+    Returns (commit latency in seconds, hash of the block it landed in), or
+    None if no node committed it.
+    """
+    payload = {'user_id': f'bench-{index}', 'transaction': {'action': 'bench', 'seq': index}, 'commitment': None}
+    started = time.time()
+    for offset in range(len(urls)):
+        url = urls[(index + offset) % len(urls)]
+        try:
+            response = requests.post(f"{url}/add_block", json=payload, timeout=100)
+            if response.status_code == 200:
+                return time.time() - started, (response.json().get('block') or {}).get('hash')
+        except requests.exceptions.RequestException as e:
+            print(f"Error submitting to {url}: {e}")
+    return None
+
+
+def run_workload(urls, transactions, concurrency):
+    """Returns (commit latencies, hashes of the blocks the transactions landed in, failures, elapsed seconds).
+
+    Batching puts several transactions into one block, so blocks are counted
+    by distinct hash rather than by committed transaction.
+    """
+    latencies = []
+    blocks = set()
+    failed = 0
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for result in executor.map(lambda index: submit(urls, index), range(transactions)):
+            if result is None:
+                failed += 1
+            else:
+                latencies.append(result[0])
+                blocks.add(result[1])
+    blocks.discard(None)
+    return latencies, blocks, failed, time.time() - started
+
+
+def benchmark(consensus, number_of_nodes, starting_port, transactions, concurrency, startup_timeout, sharded=False):
+    """Start a local cluster running `consensus`, drive the workload and report the results."""
+    # PoA authorities are the first two nodes of the cluster under test
+    extra_args = ['--consensus', consensus, '--authorized-nodes', f'node_{starting_port}', f'node_{starting_port + 1}']
+    if sharded:
+        extra_args.append('--sharded')
+    urls = deploy_nodes.start_cluster(starting_port, number_of_nodes, extra_args)
+
+    try:
+        if deploy_nodes.wait_until_ready(urls, startup_timeout):
+            raise RuntimeError(f"{consensus}: nodes did not come up within {startup_timeout}s")
+
+        before = get_network_stats(urls)
+        latencies, blocks, failed, elapsed = run_workload(urls, transactions, concurrency)
+        after = get_network_stats(urls)
+    finally:
+        deploy_nodes.stop_cluster()
+
+    committed = len(latencies)
+    messages = after['messages_sent'] - before['messages_sent']
+    sent_bytes = after['bytes_sent'] - before['bytes_sent']
+    return {
+        'consensus': f"{consensus}-sharded" if sharded else consensus,
+        'nodes': number_of_nodes,
+        'transactions': committed,
+        'failed': failed,
+        'blocks': len(blocks),
+        'tx_per_sec': committed / elapsed if elapsed else 0.0,
+        'blocks_per_sec': len(blocks) / elapsed if elapsed else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'messages_per_block': messages / len(blocks) if blocks else None,
+        'bytes_per_block': sent_bytes / len(blocks) if blocks else None,
+    }
+
+
+def print_report(results):
+    columns = ['consensus', 'transactions', 'failed', 'blocks', 'tx_per_sec', 'blocks_per_sec', 'latency_p50',
+               'latency_p90', 'latency_p99', 'messages_per_block', 'bytes_per_block']
+    print("\n" + " | ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        cells = []
+        for column in columns:
+            value = result[column]
+            cells.append(f"{value:>18.3f}" if isinstance(value, float) else f"{str(value):>18}")
+        print(" | ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the same scripted workload against each consensus algorithm.")
+    parser.add_argument('--consensus', nargs='+', default=['HRBC', 'PoA'])
+    parser.add_argument('--nodes', type=int, default=5)
+    parser.add_argument('--starting-port', type=int, default=5000)
+    parser.add_argument('--transactions', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Concurrent submitters (1 keeps blocks strictly sequential)")
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--sharded', action='store_true',
+                        help="Run HRBC with per-cluster shard chains (use --concurrency > 1 to load every shard); "
+                             "other consensus algorithms run unsharded")
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for consensus in args.consensus:
+        sharded = args.sharded and consensus.upper() == 'HRBC'  # Shards are HRBC clusters; nodes refuse --sharded otherwise
+        if args.sharded and not sharded:
+            print(f"\n--sharded applies to HRBC only; running {consensus} unsharded.")
+        print(f"\nBenchmarking {consensus} on {args.nodes} nodes with {args.transactions} transactions...")
+        results.append(benchmark(consensus, args.nodes, args.starting_port, args.transactions,
+                                 args.concurrency, args.startup_timeout, sharded))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
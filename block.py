@@ -3,33 +3,102 @@
 import hashlib
 import json
 import time
+from merkle import MerkleTree, hash_transaction
 
 class Block:
-    def __init__(self, user_id, previous_hash, transaction, commitment, timestamp=None, nonce=0):
+    FIELDS = ('user_id', 'previous_hash', 'transaction', 'commitment', 'timestamp', 'nonce', 'proposer', 'loads')
+    HEADER_FIELDS = ('previous_hash', 'timestamp', 'merkle_root', 'nonce', 'user_id', 'commitment', 'proposer', 'loads_digest')
+
+    def __init__(self, user_id, previous_hash, transaction, commitment, timestamp=None, nonce=0, proposer=None,
+                 loads=None):
         self.user_id = user_id
         self.previous_hash = previous_hash
         self.transaction = transaction
         self.commitment = commitment
         self.timestamp = timestamp or time.time()
         self.nonce = nonce
+        self.proposer = proposer  # Node that sealed the block
+        self.loads = loads  # Node load reports for leader election (see load.py), covered by loads_digest
+        self.loads_digest = Block.hash_loads(loads) if loads else None
+        self._merkle_tree = MerkleTree([hash_transaction(tx, previous_hash, index)
+                                        for index, tx in enumerate(self.get_transactions())])
+        self.merkle_root = self._merkle_tree.root
         self.hash = self.calculate_hash()
+        self.certificate = None  # Quorum certificate (see quorum.py); travels with the block but is not hashed
+
+    @classmethod
+    def from_dict(cls, block_data):
+        """Rebuild a block from its serialized form, ignoring derived fields."""
+        block = cls(**{field: block_data.get(field) for field in cls.FIELDS if field in block_data})
+        block.certificate = block_data.get('certificate')
+        return block
+
+    @staticmethod
+    def hash_loads(loads):
+        return hashlib.sha256(json.dumps(loads, sort_keys=True).encode()).hexdigest()
+
+    def get_transactions(self):
+        """Return the block's transactions as a list (a single transaction is wrapped)."""
+        if isinstance(self.transaction, list):
+            return self.transaction
+        return [self.transaction]
+
+    def get_merkle_tree(self):
+        """Return the cached Merkle tree over this block's transactions."""
+        return self._merkle_tree
 
     def calculate_hash(self):
         """Calculate the SHA-256 hash of the block's content."""
-        block_string = json.dumps({
-            'user_id': self.user_id,
-            'previous_hash': self.previous_hash,
-            'transaction': self.transaction,
-            'nonce': self.nonce,
-            'commitment': self.commitment,
-            'timestamp': self.timestamp,
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
-    
+        return Block.hash_header(self.get_header())
+
+    @staticmethod
+    def hash_header(header):
+        """Calculate a block hash from header fields alone (no transactions needed)."""
+        nonce_string = json.dumps(header['nonce']).encode()
+        return hashlib.sha256(Block.header_prefix(header) + nonce_string).hexdigest()
+
+    @staticmethod
+    def header_prefix(header):
+        """Serialized header without the nonce. The nonce is appended last so miners can
+        hash this prefix once and only feed each candidate nonce."""
+        fields = {
+            'user_id': header['user_id'],
+            'previous_hash': header['previous_hash'],
+            'merkle_root': header['merkle_root'],
+            'commitment': header['commitment'],
+            'timestamp': header['timestamp'],
+            'proposer': header.get('proposer'),
+        }
+        if header.get('loads_digest'):
+            fields['loads_digest'] = header['loads_digest']  # Only blocks that carry load reports, so other hashes are unchanged
+        return json.dumps(fields, sort_keys=True).encode()
+
+    def get_header(self, height=None):
+        """Return the compact header: everything needed to check the hash, minus transactions."""
+        header = {field: getattr(self, field) for field in self.HEADER_FIELDS}
+        if height is not None:
+            header['height'] = height
+        if hasattr(self, 'hash'):
+            header['hash'] = self.hash
+        return header
+
+    @classmethod
+    def header_from_dict(cls, block_data, height=None):
+        """The header of a serialized block, without rebuilding the block."""
+        header = {field: block_data.get(field) for field in cls.HEADER_FIELDS}
+        if height is not None:
+            header['height'] = height
+        header['hash'] = block_data.get('hash')
+        return header
+
+    def to_dict(self):
+        """Return the block's public fields, leaving out cached structures."""
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
     def size_in_bytes(self):
         """Calculate the size of the block in bytes."""
-        block_json = json.dumps(self.__dict__, sort_keys=True)
+        block_json = json.dumps(self.to_dict(), sort_keys=True)
         return len(block_json.encode('utf-8'))
 
     def __str__(self):
-        return json.dumps(self.__dict__, indent=4)
+        return json.dumps(self.to_dict(), indent=4)
@@ -2,24 +2,51 @@
 
 import importlib
 import threading
+from collections import deque
 from block import Block
+from chain_store import ChainStore, DiskIndex
 import os
 import time
 from consensus import Consensus
-from config import P, G, AUTHORIZED_NODES
+from config import P, G, AUTHORIZED_NODES, PROPOSAL_ATTEMPTS, METRICS_HISTORY
+from snapshot import SnapshotManager
+from catchup import OrphanPool, CatchUp
+from dedup import SeenCache
+from events import BlockEventHub
+import load
+import tracing
 import logging
-import random
+import determinism
 import traceback
 
 class Blockchain:
-    def __init__(self, consensus_algorithm, node_id, data_dir):
+    # Outcomes of receive_block
+    BLOCK_ACCEPTED = 'accepted'
+    BLOCK_DUPLICATE = 'duplicate'
+    BLOCK_ORPHANED = 'orphaned'
+    BLOCK_REJECTED = 'rejected'
+
+    def __init__(self, consensus_algorithm, node_id, data_dir, authorized_nodes=None):
         self.id = node_id
         self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
         self.reputation_tokens = self.initialize_reputation_tokens()
-        self.chain = [self.create_genesis_block()]
+        self.snapshots = SnapshotManager(self)
+        self.chain = ChainStore(os.path.join(self.data_dir, 'chain'))  # Recent blocks in memory, the rest on disk
+        self.base_height = 0  # Height of chain[0]; non-zero after bootstrapping from a snapshot
+        # Both indexes grow with the chain, so they live on disk next to it
+        self.tx_index = DiskIndex(os.path.join(self.data_dir, 'chain', 'tx_index.sqlite'), width=2)  # tx_id -> (block height, leaf index)
+        self.block_index = DiskIndex(os.path.join(self.data_dir, 'chain', 'block_index.sqlite'))  # block hash -> height
+        self.user_commitments = {}  # user_id -> ZKP commitment C = g^H mod p, from register transactions
+        self.lock = threading.RLock()  # Serializes changes to the chain tip
+        self.orphans = OrphanPool()
+        self.catchup = CatchUp(self)
+        self.seen_blocks = SeenCache()  # block hash -> receive_block outcome
+        self.seen_votes = SeenCache()   # block hash -> vote cast
+        self.block_events = BlockEventHub()  # Pushes committed blocks to /events/blocks subscribers
+        self.append_block(self.create_genesis_block())
         self.peer_nodes = self.get_peer_nodes(node_id)
-        self.authorized_nodes = AUTHORIZED_NODES if consensus_algorithm.lower() == 'poa' else []
+        self.authorized_nodes = (authorized_nodes or AUTHORIZED_NODES) if consensus_algorithm.lower() == 'poa' else []
         self.consensus = self.load_consensus(consensus_algorithm)
         self.pending_transactions = []  # Initialize empty list for pending transactions
         self.user_db = {}
@@ -27,12 +54,13 @@ class Blockchain:
         self.p = P
         self.g = G
 
+        # Per-block samples keep only the last METRICS_HISTORY blocks
         self.metrics = {
-            'block_times': [],               # List to store time taken for each block
-            'transactions_per_block': [],    # List to store number of transactions per block
-            'block_sizes': [],               # List to store size of each block in bytes
-            'total_size': 0,                 # Cumulative size of the blockchain
-            'difficulty': []                 # List to store difficulty levels
+            'block_times': deque(maxlen=METRICS_HISTORY),             # Time taken for each block
+            'transactions_per_block': deque(maxlen=METRICS_HISTORY),  # Number of transactions per block
+            'block_sizes': deque(maxlen=METRICS_HISTORY),             # Size of each block in bytes
+            'total_size': 0,                                          # Cumulative size of the blockchain
+            'difficulty': deque(maxlen=METRICS_HISTORY)               # Difficulty levels
         }
         self.last_block_time = self.chain[0].timestamp  # Initialize with genesis block timestamp
 
@@ -62,27 +90,179 @@ class Blockchain:
             logging.error(f"Unexpected error loading consensus: {e}")
             raise e
 
+    def append_block(self, block):
+        """Append a committed block to the chain and index its transactions."""
+        height = self.base_height + len(self.chain)
+        self.chain.append(block)
+        self.block_index[block.hash] = height
+        self.tx_index.update((tx_id, (height, leaf_index)) for leaf_index, tx_id in enumerate(block.get_merkle_tree().leaves))
+        for transaction in block.get_transactions():
+            if isinstance(transaction, dict) and transaction.get('action') == 'register' and 'commitment' in transaction:
+                self.user_commitments[transaction['user_id']] = transaction['commitment']
+        self.block_events.publish(height, block)
+        return height
+
+    def get_height(self):
+        """Height of the chain tip."""
+        return self.base_height + len(self.chain) - 1
+
+    def get_block(self, height):
+        """Return the block at `height`, or None if it is not held locally."""
+        if height < self.base_height or height > self.get_height():
+            return None
+        return self.chain[height - self.base_height]
+
+    def reset_chain(self, anchor_block, height):
+        """Replace the chain with a single anchor block at `height` (used when restoring a snapshot)."""
+        self.chain.reset(anchor_block)
+        self.base_height = height
+        self.tx_index.clear()
+        self.block_index.clear()
+        self.block_index[anchor_block.hash] = height
+        self.tx_index.update((tx_id, (height, leaf_index)) for leaf_index, tx_id in enumerate(anchor_block.get_merkle_tree().leaves))
+
+    def has_block(self, block_hash):
+        return block_hash in self.block_index
+
+    @tracing.traced('blockchain.receive_block')
+    def receive_block(self, new_block, consensus_id):
+        """Validate and commit a block produced elsewhere.
+
+        Blocks already on the chain are ignored without penalty. Blocks whose
+        parent is unknown are held in the orphan pool and trigger a catch-up;
+        they are applied once their parent is committed.
+        """
+        with self.lock:
+            if self.has_block(new_block.hash):
+                return self.BLOCK_DUPLICATE
+            if new_block.previous_hash != self.get_last_block().hash and not self.has_block(new_block.previous_hash):
+                logging.info(f"[Blockchain] Parent of block {new_block.hash} is unknown; buffering it as an orphan.")
+                self.orphans.add(new_block, consensus_id)
+                self.catchup.request()
+                return self.BLOCK_ORPHANED
+            if not self.consensus.validate_block(self, new_block, consensus_id):
+                return self.BLOCK_REJECTED
+            self.commit_block(new_block)
+            self.connect_orphans()
+            return self.BLOCK_ACCEPTED
+
+    def commit_block(self, new_block):
+        """Apply a validated block through the consensus plugin, then snapshot if one is due."""
+        with self.lock:
+            self.consensus.process_new_block(self, new_block)
+            self.snapshots.maybe_snapshot(self.get_height())
+
+    def connect_orphans(self):
+        """Apply buffered orphans that now extend the tip."""
+        with self.lock:
+            children = self.orphans.pop_children(self.get_last_block().hash)
+            while children:
+                orphan, consensus_id = children.pop()
+                if self.consensus.validate_block(self, orphan, consensus_id):
+                    self.commit_block(orphan)
+                    logging.info(f"[Blockchain] Connected orphan block {orphan.hash}.")
+                    children = self.orphans.pop_children(orphan.hash)
+
+    def memory_structures(self):
+        """The in-memory containers that grow with use, by name, for /debug/memory (see memory.py).
+
+        The block and transaction indexes are on disk; their sizes are under chain_store in /metrics.
+        """
+        return {
+            'chain.hot': self.chain.hot,
+            'chain.cache': self.chain.cache,
+            'user_db': self.user_db,
+            'user_commitments': self.user_commitments,
+            'issued_tokens': self.issued_tokens,
+            'pending_transactions': self.pending_transactions,
+            'orphans': self.orphans.blocks,
+            'seen_blocks': self.seen_blocks.entries,
+            'seen_votes': self.seen_votes.entries,
+            **{f'metrics.{name}': values for name, values in self.metrics.items() if isinstance(values, deque)},
+        }
+
+    def get_transaction_proof(self, tx_id):
+        """Build a Merkle inclusion proof for a committed transaction, or None if unknown."""
+        location = self.tx_index.get(tx_id)
+        if location is None:
+            return None
+        height, leaf_index = location
+        block = self.get_block(height)
+        return {
+            'tx_id': tx_id,
+            'block_height': height,
+            'block_hash': block.hash,
+            'merkle_root': block.merkle_root,
+            'leaf_index': leaf_index,
+            'proof': block.get_merkle_tree().get_proof(leaf_index),
+        }
+
+    def get_headers(self, start=0, count=None):
+        """Return the header chain from height `start`, at most `count` entries."""
+        end = self.get_height() + 1 if count is None else min(self.get_height() + 1, start + count)
+        start = max(start, self.base_height)
+        return [Block.header_from_dict(block_data, height)
+                for height, block_data in zip(range(start, end), self.iter_block_dicts(start, end))]
+
+    def get_blocks(self, start=0, count=None):
+        """Return serialized blocks from height `start`, at most `count` entries."""
+        end = self.get_height() + 1 if count is None else min(self.get_height() + 1, start + count)
+        start = max(start, self.base_height)
+        return list(self.iter_block_dicts(start, end))
+
+    def iter_block_dicts(self, start=0, end=None):
+        """Serialized blocks for heights [start, end), streamed from disk so bulk reads do not evict cached blocks."""
+        end = self.get_height() + 1 if end is None else end
+        return self.chain.iter_dicts(start - self.base_height, end - self.base_height)
+
     def get_last_block(self):
         last_block = self.chain[-1]
         logging.debug(f"[Blockchain] Last block retrieved: {last_block}")
         return last_block
 
+    @tracing.traced('blockchain.add_block')
     def add_block(self, user_id, transaction, commitment):
-     last_block = self.get_last_block()
-     if self.pending_transactions:  # Check and add pending transactions
-         transaction = self.pending_transactions
-         self.pending_transactions = []  # Clear pending transactions
+     """Run consensus on a new block and commit it. Callers go through forwarding.commit_batch, which
+     serializes local proposals. A block received from another leader can still move the tip while consensus
+     runs; the proposal is then re-run on the new tip, up to PROPOSAL_ATTEMPTS times."""
+     with self.lock:
+         if self.pending_transactions:  # Check and add pending transactions
+             transaction = self.pending_transactions
+             self.pending_transactions = []  # Clear pending transactions
 
-     new_block = self.consensus.initiate_consensus(self, user_id, last_block, transaction, commitment)
+     for attempt in range(PROPOSAL_ATTEMPTS):
+         last_block = self.get_last_block()
+         started = time.monotonic()
+         new_block = self.consensus.initiate_consensus(self, user_id, last_block, transaction, commitment)
+         load.record_latency(time.monotonic() - started)
 
-     if new_block:
-         self.consensus.process_new_block(self, new_block)  # Call consensus class's implementation of this method.
+         if not new_block:
+             if self.get_last_block().hash != last_block.hash:
+                 # Mining was stopped because another leader committed this height; propose on the new tip
+                 logging.info(f"[Blockchain] Tip moved while mining; proposing again (attempt {attempt + 1}).")
+                 continue
+             logging.warning("[Blockchain] Consensus failed or block creation failed.")
+             return None, None
+
+         with self.lock:
+             if new_block.previous_hash != self.get_last_block().hash:
+                 # Another block was committed while consensus ran; this one no longer extends the tip
+                 logging.info(f"[Blockchain] Tip moved during consensus on {new_block.hash}; proposing again (attempt {attempt + 1}).")
+                 continue
+             # Validated like a received block, which also credits the proposer exactly as the receivers do
+             if not self.consensus.validate_block(self, new_block, self.id):
+                 logging.warning(f"[Blockchain] Dropping block {new_block.hash}: it failed validation.")
+                 return None, None
+             self.commit_block(new_block)
          return new_block, self.id
 
-     else:
-         logging.warning("[Blockchain] Consensus failed or block creation failed.")
-         return None, None
+     logging.warning(f"[Blockchain] Tip kept moving during consensus; giving up after {PROPOSAL_ATTEMPTS} attempts.")
+     return None, None
+
 
+    def get_metrics(self):
+        """The metrics in JSON-ready form."""
+        return {name: list(values) if isinstance(values, deque) else values for name, values in self.metrics.items()}
 
     def update_metrics(self, new_block):
         logging.debug(f"[Blockchain] Updating metrics with new block: {new_block}")
@@ -91,7 +271,7 @@ class Blockchain:
         self.last_block_time = new_block.timestamp  # Update for the next block
         logging.debug(f"[Blockchain] Block time: {block_time} seconds.")
 
-        self.metrics['transactions_per_block'].append(1)  # Modify if multiple transactions per block
+        self.metrics['transactions_per_block'].append(len(new_block.get_transactions()))
         logging.debug(f"[Blockchain] Transactions per block updated: {self.metrics['transactions_per_block']}")
 
         block_size = new_block.size_in_bytes()
@@ -134,7 +314,7 @@ class Blockchain:
         reputation = {}
         
         # Assign initial reputation to self with a random value
-        reputation[self.id] = random.randint(50, 100)  # Example: self-reputation between 50 and 100
+        reputation[self.id] = determinism.shared_rng('reputation', self.id).randint(50, 100)  # Example: self-reputation between 50 and 100
 
         # Define the path to the peers file
         peers_file = os.path.join(self.data_dir, 'peers.txt')
@@ -149,7 +329,7 @@ class Blockchain:
 
             # Assign random initial reputation to each peer node
             for node in peers:
-                reputation[node] = random.randint(50, 100)  # Assign random reputation values between 50 and 100
+                reputation[node] = determinism.shared_rng('reputation', node).randint(50, 100)  # Assign random reputation values between 50 and 100
 
             logging.debug(f"[Blockchain] Initialized reputation_tokens with random values: {reputation}")
         else:
@@ -157,6 +337,6 @@ class Blockchain:
             # Default peer nodes (can be adjusted)
             default_peers = [f"node_{i}" for i in range(2, 5)]  # Simulate peer IDs for default peers
             for node in default_peers:
-                reputation[node] = random.randint(50, 100)
+                reputation[node] = determinism.shared_rng('reputation', node).randint(50, 100)
 
         return reputation
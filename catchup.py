@@ -0,0 +1,176 @@
+# catchup.py
+
+import concurrent.futures
+import logging
+import threading
+from collections import OrderedDict
+import requests
+from block import Block
+from config import ORPHAN_POOL_SIZE, CATCHUP_CHUNK_SIZE, CATCHUP_PARALLELISM, CATCHUP_FETCH_TIMEOUT
+import wire
+
+
+class OrphanPool:
+    """Bounded buffer of blocks whose parent has not arrived yet.
+
+    Blocks are indexed by their own hash (for eviction, oldest first) and by
+    `previous_hash` so children can be found once the parent is committed.
+    """
+
+    def __init__(self, max_size=ORPHAN_POOL_SIZE):
+        self.max_size = max_size
+        self.blocks = OrderedDict()  # hash -> (block, consensus_id)
+        self.by_parent = {}          # previous_hash -> set of hashes
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.blocks
+
+    def add(self, block, consensus_id):
+        with self.lock:
+            if block.hash in self.blocks:
+                return
+            self.blocks[block.hash] = (block, consensus_id)
+            self.by_parent.setdefault(block.previous_hash, set()).add(block.hash)
+            while len(self.blocks) > self.max_size:
+                evicted_hash, (evicted, _) = self.blocks.popitem(last=False)
+                self._unlink(evicted_hash, evicted.previous_hash)
+                logging.debug(f"[OrphanPool] Evicted orphan {evicted_hash}")
+
+    def pop_children(self, parent_hash):
+        """Remove and return (block, consensus_id) pairs whose parent is `parent_hash`."""
+        with self.lock:
+            children = []
+            for block_hash in self.by_parent.pop(parent_hash, set()):
+                children.append(self.blocks.pop(block_hash))
+            return children
+
+    def _unlink(self, block_hash, parent_hash):
+        siblings = self.by_parent.get(parent_hash)
+        if siblings is not None:
+            siblings.discard(block_hash)
+            if not siblings:
+                del self.by_parent[parent_hash]
+
+
+class CatchUp:
+    """Detects that the node has fallen behind and downloads the missing range.
+
+    The range is split into chunks that are fetched from several peers in
+    parallel, then applied in height order. Runs on a background thread so
+    block ingress is never held up by a download.
+    """
+
+    def __init__(self, blockchain, chunk_size=CATCHUP_CHUNK_SIZE, parallelism=CATCHUP_PARALLELISM):
+        self.blockchain = blockchain
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.running = threading.Lock()
+
+    def request(self):
+        """Start a catch-up in the background unless one is already running."""
+        if self.running.locked():
+            return False
+        threading.Thread(target=self.run, daemon=True).start()
+        return True
+
+    def run(self):
+        if not self.running.acquire(blocking=False):
+            return 0
+        try:
+            return self.catch_up()
+        except Exception as e:
+            logging.error(f"[CatchUp] Catch-up failed: {e}")
+            logging.debug("Traceback:", exc_info=True)
+            return 0
+        finally:
+            self.running.release()
+
+    def get_peer_heights(self):
+        """Ask every peer for its tip height in parallel."""
+        def fetch_height(peer):
+            response = wire.get(peer, '/headers', params={'start': 0, 'count': 0})
+            response.raise_for_status()
+            return wire.read_response(peer, response)['height']
+
+        heights = {}
+        peers = self.blockchain.peer_nodes
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(peers), 1)) as executor:
+            futures = {executor.submit(fetch_height, peer): peer for peer in peers}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    heights[futures[future]] = future.result()
+                except requests.exceptions.RequestException as e:
+                    logging.debug(f"[CatchUp] Could not get height from {futures[future]}: {e}")
+        return heights
+
+    def fetch_range(self, peer, start, count):
+        response = wire.get(peer, '/blocks', timeout=CATCHUP_FETCH_TIMEOUT, params={'start': start, 'count': count})
+        response.raise_for_status()
+        return wire.read_response(peer, response)['blocks']
+
+    def download(self, start, end, peer_heights):
+        """Download heights [start, end] in chunks spread across peers. Returns block dicts in order."""
+        chunks = [(chunk_start, min(self.chunk_size, end - chunk_start + 1))
+                  for chunk_start in range(start, end + 1, self.chunk_size)]
+
+        def fetch_chunk(index, chunk_start, count):
+            last = chunk_start + count - 1
+            sources = [peer for peer, height in peer_heights.items() if height >= last]
+            # Rotate the starting peer per chunk so the load is spread, then fall back to the others
+            sources = sources[index % len(sources):] + sources[:index % len(sources)] if sources else []
+            for peer in sources:
+                try:
+                    blocks = self.fetch_range(peer, chunk_start, count)
+                    if len(blocks) == count:
+                        return blocks
+                except requests.exceptions.RequestException as e:
+                    logging.debug(f"[CatchUp] Chunk {chunk_start}+{count} from {peer} failed: {e}")
+            raise RuntimeError(f"No peer could serve heights {chunk_start}..{last}")
+
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            futures = {executor.submit(fetch_chunk, index, chunk_start, count): chunk_start
+                       for index, (chunk_start, count) in enumerate(chunks)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except RuntimeError as e:
+                    logging.warning(f"[CatchUp] {e}")
+
+        # Only the contiguous prefix is usable
+        blocks = []
+        for chunk_start, _ in chunks:
+            if chunk_start not in results:
+                break
+            blocks.extend(results[chunk_start])
+        return blocks
+
+    def catch_up(self):
+        """Bring the local chain up to the highest peer tip. Returns the number of blocks applied."""
+        blockchain = self.blockchain
+        peer_heights = self.get_peer_heights()
+        if not peer_heights:
+            return 0
+        local_height = blockchain.get_height()
+        target = max(peer_heights.values())
+        if target <= local_height:
+            return 0
+
+        logging.info(f"[CatchUp] Local tip {local_height} is behind {target}; downloading {target - local_height} blocks.")
+        applied = 0
+        for block_data in self.download(local_height + 1, target, peer_heights):
+            block = Block.from_dict(block_data)
+            if block.hash != block_data.get('hash'):
+                logging.warning(f"[CatchUp] Downloaded block {block_data.get('hash')} does not match its content.")
+                break
+            status = blockchain.receive_block(block, None)
+            if status not in (blockchain.BLOCK_ACCEPTED, blockchain.BLOCK_DUPLICATE):
+                logging.warning(f"[CatchUp] Downloaded block {block.hash} was {status}.")
+                break
+            applied += 1
+        logging.info(f"[CatchUp] Applied {applied} blocks; tip is now {blockchain.get_height()}.")
+        return applied
@@ -0,0 +1,91 @@
+# chain_query.py
+
+import argparse
+import json
+import os
+from chain_export import require_numpy, COLUMNS, DICTIONARY_COLUMNS
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for exports and offline analysis
+    np = None
+
+
+class ChainColumns:
+    """Read-only, memory-mapped view of a directory written by chain_export."""
+
+    def __init__(self, path):
+        require_numpy()
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        rows = self.meta['rows']
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')[:rows] for name in COLUMNS}
+        self.dictionaries = {}
+        for name in DICTIONARY_COLUMNS:
+            with open(os.path.join(path, f'{name}.dict.json')) as f:
+                self.dictionaries[name] = json.load(f)
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def without_genesis(self, name):
+        """A column with the genesis block dropped; its fixed timestamp would skew interval statistics."""
+        column = self[name]
+        return column[1:] if len(self) and self['height'][0] == 0 else column
+
+    def block_intervals(self, percentiles=(50, 90, 99)):
+        """Percentiles of the time between consecutive blocks, in seconds (genesis excluded)."""
+        intervals = np.diff(self.without_genesis('timestamp'))
+        if intervals.size == 0:
+            return {p: None for p in percentiles}
+        return dict(zip(percentiles, np.percentile(intervals, percentiles).tolist()))
+
+    def counts_by(self, column, top=None):
+        """Blocks per distinct value of a dictionary-encoded column, most frequent first."""
+        counts = np.bincount(self[column], minlength=len(self.dictionaries[column]))
+        order = np.argsort(counts)[::-1][:top]
+        return [(self.dictionaries[column][code], int(counts[code])) for code in order if counts[code]]
+
+    def throughput(self, window=60.0):
+        """Blocks and transactions per second over the whole chain and in `window`-second buckets."""
+        timestamps = self.without_genesis('timestamp')
+        tx_counts = self.without_genesis('tx_count')
+        if timestamps.size < 2:
+            return {'blocks_per_sec': None, 'tx_per_sec': None, 'peak_blocks_per_window': None}
+        span = float(timestamps[-1] - timestamps[0]) or 1.0
+        buckets = ((timestamps - timestamps[0]) // window).astype(np.int64)
+        return {
+            'blocks_per_sec': timestamps.size / span,
+            'tx_per_sec': float(tx_counts.sum()) / span,
+            'peak_blocks_per_window': int(np.bincount(buckets).max()),
+        }
+
+    def summary(self, top=10):
+        sizes = self['size']
+        return {
+            'blocks': len(self),
+            'first_height': int(self['height'][0]) if len(self) else None,
+            'last_height': int(self['height'][-1]) if len(self) else None,
+            'total_bytes': int(sizes.sum()),
+            'mean_block_bytes': float(sizes.mean()) if len(self) else None,
+            'block_interval_percentiles': self.block_intervals(),
+            'throughput': self.throughput(),
+            'blocks_by_proposer': self.counts_by('proposer', top),
+            'blocks_by_user': self.counts_by('user_id', top),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a columnar chain export written by chain_export.py.")
+    parser.add_argument('path', help="Directory produced by chain_export.py")
+    parser.add_argument('--top', type=int, default=10, help="How many proposers/users to list")
+    args = parser.parse_args()
+
+    print(json.dumps(ChainColumns(args.path).summary(args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# chain_store.py
+
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict, deque
+from block import Block
+from config import CHAIN_HOT_BLOCKS, CHAIN_CACHE_BLOCKS
+
+OFFSET = struct.Struct('<Q')
+
+
+class MappedFile:
+    """An append-only file that is read back through a read-only memory map.
+
+    The map is re-created when a read reaches past its end, so appends cost a
+    write and readers see them without reopening the file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'w+b')  # Truncates: the store starts empty, like the in-memory chain did
+        self.size = 0
+        self.map = None
+
+    def append(self, data):
+        offset = self.size
+        self.file.write(data)
+        self.file.flush()  # Make the bytes visible to the map
+        self.size += len(data)
+        return offset
+
+    def read(self, start, end):
+        if self.map is None or end > len(self.map):
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map[start:end]
+
+    def truncate(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.seek(0)
+        self.file.truncate()
+        self.size = 0
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class DiskIndex:
+    """A mapping from string keys to integers or integer tuples, kept in an SQLite file.
+
+    Stands in for the dicts that index the chain (block hash -> height,
+    tx id -> (height, leaf index)), which would otherwise grow with it.
+    Supports `in`, get, item assignment, update, clear and len(). Like the
+    chain store it is rebuilt on every launch, so it skips journaling and
+    syncing.
+    """
+
+    def __init__(self, path, width=1):
+        if os.path.exists(path):
+            os.remove(path)
+        self.width = width
+        self.columns = ', '.join(f'v{i}' for i in range(width))
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=OFF')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute(f'CREATE TABLE entries (key TEXT PRIMARY KEY, {self.columns})')
+        self.lock = threading.Lock()
+
+    def row(self, key, value):
+        return (key, *(value if self.width > 1 else (value,)))
+
+    def update(self, items):
+        rows = [self.row(key, value) for key, value in items]
+        placeholders = ', '.join('?' * (self.width + 1))
+        with self.lock:
+            self.db.execute('BEGIN')
+            self.db.executemany(f'INSERT OR REPLACE INTO entries VALUES ({placeholders})', rows)
+            self.db.execute('COMMIT')
+
+    def __setitem__(self, key, value):
+        self.update([(key, value)])
+
+    def get(self, key, default=None):
+        with self.lock:
+            row = self.db.execute(f'SELECT {self.columns} FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        return row if self.width > 1 else row[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM entries')
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            pages = self.db.execute('PRAGMA page_count').fetchone()[0] * self.db.execute('PRAGMA page_size').fetchone()[0]
+        return {'entries': entries, 'disk_bytes': pages}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class ChainStore:
+    """The chain as a sequence of blocks, with only recent blocks held in memory.
+
+    Every block is appended to `blocks.jsonl` as its serialized form, and its
+    byte offset to `blocks.idx` (fixed-width, so position i's offset is at
+    byte 8*i). The last CHAIN_HOT_BLOCKS blocks stay resident, where
+    validation and the tip always find them; older blocks are read back
+    through memory maps of both files and kept in an LRU of
+    CHAIN_CACHE_BLOCKS. Memory use therefore stays flat as the chain grows.
+
+    Positions are relative to the first block held; the Blockchain keeps
+    track of the height that position 0 stands for (`base_height`). Supports
+    len(), indexing (negative too), iteration and append, so it can stand in
+    for the list the chain used to be.
+    """
+
+    def __init__(self, directory, hot_size=CHAIN_HOT_BLOCKS, cache_size=CHAIN_CACHE_BLOCKS):
+        os.makedirs(directory, exist_ok=True)
+        self.hot_size = max(hot_size, 1)
+        self.cache_size = cache_size
+        self.blocks = MappedFile(os.path.join(directory, 'blocks.jsonl'))
+        self.offsets = MappedFile(os.path.join(directory, 'blocks.idx'))
+        self.hot = deque()
+        self.cache = OrderedDict()  # position -> Block, least recently read first
+        self.count = 0
+        self.lock = threading.Lock()
+        self.stats_counters = {'hot_hits': 0, 'cache_hits': 0, 'disk_reads': 0}
+
+    def append(self, block):
+        line = json.dumps(block.to_dict()).encode() + b'\n'
+        with self.lock:
+            self.offsets.append(OFFSET.pack(self.blocks.append(line)))
+            self.hot.append(block)
+            if len(self.hot) > self.hot_size:
+                self.hot.popleft()
+            self.count += 1
+
+    def reset(self, anchor_block):
+        """Drop every block and start again from `anchor_block` (snapshot restore)."""
+        with self.lock:
+            self.blocks.truncate()
+            self.offsets.truncate()
+            self.hot.clear()
+            self.cache.clear()
+            self.count = 0
+        self.append(anchor_block)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if not isinstance(position, int):
+            raise TypeError("ChainStore indices must be integers")
+        with self.lock:
+            if position < 0:
+                position += self.count
+            if position < 0 or position >= self.count:
+                raise IndexError("chain position out of range")
+            hot_start = self.count - len(self.hot)
+            if position >= hot_start:
+                self.stats_counters['hot_hits'] += 1
+                return self.hot[position - hot_start]
+            block = self.cache.get(position)
+            if block is not None:
+                self.cache.move_to_end(position)
+                self.stats_counters['cache_hits'] += 1
+                return block
+            self.stats_counters['disk_reads'] += 1
+            line = self.read_line(position)
+        block = Block.from_dict(json.loads(line))
+        with self.lock:
+            self.cache[position] = block
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return block
+
+    def __iter__(self):
+        for block_data in self.iter_dicts():
+            yield Block.from_dict(block_data)
+
+    def read_line(self, position):
+        """Raw serialized block at `position` (caller holds the lock)."""
+        start = OFFSET.unpack(self.offsets.read(position * OFFSET.size, (position + 1) * OFFSET.size))[0]
+        if position + 1 < self.count:
+            end = OFFSET.unpack(self.offsets.read((position + 1) * OFFSET.size, (position + 2) * OFFSET.size))[0]
+        else:
+            end = self.blocks.size
+        return self.blocks.read(start, end)
+
+    def iter_dicts(self, start=0, end=None):
+        """Serialized blocks for positions [start, end), read straight from disk without filling the cache.
+
+        Blocks appended after the call are not included.
+        """
+        with self.lock:
+            end = self.count if end is None else min(end, self.count)
+        for position in range(max(start, 0), end):
+            with self.lock:
+                line = self.read_line(position)
+            yield json.loads(line)
+
+    def stats(self):
+        with self.lock:
+            return {'blocks': self.count, 'hot': len(self.hot), 'cached': len(self.cache),
+                    'disk_bytes': self.blocks.size + self.offsets.size, **self.stats_counters}
+
+    def close(self):
+        with self.lock:
+            self.blocks.close()
+            self.offsets.close()
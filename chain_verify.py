@@ -0,0 +1,79 @@
+# chain_verify.py
+
+import concurrent.futures
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from block import Block
+from config import VERIFY_WORKERS, VERIFY_SEGMENT_SIZE
+
+
+def verify_segment(start_height, block_dicts):
+    """Recompute hashes and check previous_hash links inside one segment.
+
+    Runs in a worker process. Returns the segment's boundary hashes so the
+    caller can stitch segments together, plus the first problem found.
+    """
+    result = {
+        'start': start_height,
+        'first_previous_hash': block_dicts[0]['previous_hash'] if block_dicts else None,
+        'last_hash': None,
+        'error_height': None,
+        'reason': None,
+    }
+    for offset, block_data in enumerate(block_dicts):
+        if Block.from_dict(block_data).hash != block_data.get('hash'):
+            result.update(error_height=start_height + offset, reason='hash mismatch')
+            break
+        if offset > 0 and block_data['previous_hash'] != result['last_hash']:
+            result.update(error_height=start_height + offset, reason='broken previous_hash link')
+            break
+        result['last_hash'] = block_data['hash']
+    return result
+
+
+def verify_chain(blockchain, workers=VERIFY_WORKERS, segment_size=VERIFY_SEGMENT_SIZE):
+    """Check the whole chain on a process pool and report the first bad height, if any."""
+    started = time.time()
+    workers = workers or os.cpu_count() or 1
+    with blockchain.lock:
+        base_height = blockchain.base_height
+        height = blockchain.get_height()
+
+    # Segments are read from the chain store as workers free up, so at most 2 * workers are in memory at once
+    block_dicts = blockchain.iter_block_dicts(base_height, height + 1)
+    results, pending = [], deque()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(base_height, height + 1, segment_size):
+            pending.append(executor.submit(verify_segment, start, list(itertools.islice(block_dicts, segment_size))))
+            if len(pending) >= 2 * workers:
+                results.append(pending.popleft().result())
+        results.extend(future.result() for future in pending)
+
+    first_bad_height, reason = None, None
+    for index, result in enumerate(results):
+        # Stitch: each segment must continue from the last block of the one before it
+        if index > 0 and result['first_previous_hash'] != results[index - 1]['last_hash']:
+            first_bad_height, reason = result['start'], 'broken previous_hash link'
+            break
+        if result['error_height'] is not None:
+            first_bad_height, reason = result['error_height'], result['reason']
+            break
+
+    report = {
+        'valid': first_bad_height is None,
+        'height': height,
+        'base_height': base_height,
+        'first_bad_height': first_bad_height,
+        'reason': reason,
+        'segments': len(results),
+        'workers': workers,
+        'elapsed': time.time() - started,
+    }
+    if report['valid']:
+        logging.info(f"[Verify] Chain verified up to height {report['height']} in {report['elapsed']:.2f}s.")
+    else:
+        logging.error(f"[Verify] Chain invalid at height {first_bad_height}: {reason}")
+    return report
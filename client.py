@@ -12,10 +12,14 @@ def mod_exp(base, exp, mod):
     """Modular exponentiation function."""
     return pow(base, exp, mod)
 
-def send_request(url, endpoint, params):
-    """Send a POST request to the given URL + endpoint."""
+def send_request(url, endpoint, params, retries=3):
+    """Send a POST request to the given URL + endpoint, backing off as told when the node answers 429."""
     try:
         response = requests.post(f"{url}/{endpoint}", json=params, timeout=100)
+        while response.status_code == 429 and retries > 0:
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+            retries -= 1
+            response = requests.post(f"{url}/{endpoint}", json=params, timeout=100)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -48,12 +52,10 @@ def main():
     print(f"\nInitiating registration with user ID: {user_id_random} and password: {password_random}")
     PARAMS = {"userId": user_id_random, "hashedPassword": password_random}
 
-    # Step 1: Register the user on all nodes
-    registration_results = parallel_requests("register", PARAMS, URLS)
-
-    # Find the first node that succeeded in registration
-    successful_node = next((url for url, result in registration_results.items() 
-                            if result and result.get('message') == "Registration successful"), None)
+    # Step 1: Register the user through any one node; followers forward to their cluster leader
+    entry_node = random.choice(URLS)
+    registration_result = send_request(entry_node, "register", PARAMS)
+    successful_node = entry_node if registration_result and registration_result.get('message') == "Registration successful" else None
 
     if successful_node:
         print(f"\nRegistration successful on node: {successful_node}")
@@ -66,6 +68,13 @@ def main():
         PARAMS_ZKP = {"userId": user_id_random, "T": T}
 
         zkp_results = parallel_requests("initiate_zkp", PARAMS_ZKP, URLS)
+        # Nodes the register block has not reached yet answer 404; give them a moment and ask again
+        for _ in range(5):
+            missing = [url for url, result in zkp_results.items() if not result]
+            if not missing:
+                break
+            time.sleep(0.5)
+            zkp_results.update(parallel_requests("initiate_zkp", PARAMS_ZKP, missing))
 
         # Collect challenges from all nodes
         challenges = {}
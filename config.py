@@ -8,9 +8,105 @@ P = 29
 G = 5
 
 DIFFICULTY_LEVEL = 4
+MINER_WORKERS = 0     # Proof-of-work processes (0 = one per CPU core)
+MINER_BATCH = 20000   # Nonces a worker tries between checks for a stop signal
+
+# Chain storage (see chain_store.py)
+CHAIN_HOT_BLOCKS = 1000    # Most recent blocks kept in memory
+CHAIN_CACHE_BLOCKS = 1000  # Older blocks kept in memory after being read back from disk (LRU)
+METRICS_HISTORY = 1000     # Most recent blocks whose per-block samples (block_times, block_sizes, ...) /metrics keeps
+
+# State snapshots (see snapshot.py)
+SNAPSHOT_INTERVAL = 100  # Write a snapshot every N blocks (0 disables)
+SNAPSHOTS_TO_KEEP = 2
+SNAPSHOT_FETCH_TIMEOUT = 30  # Seconds allowed for downloading a snapshot or a batch of tail blocks
+
+# Reproducible runs (see determinism.py); None keeps runs randomized
+RANDOM_SEED = None
+
+# Follower -> cluster leader request forwarding (see forwarding.py)
+FORWARD_BATCH_SIZE = 50       # Forwarded requests coalesced into one batch at most
+FORWARD_BATCH_WINDOW = 0.02   # Seconds a batch waits for more requests after the first
+FORWARD_RETRIES = 3           # Retries when the leader is unreachable
+FORWARD_REROUTES = 8          # Re-routes when the leader has changed (every block under PoA's turn order)
+FORWARD_TIMEOUT = 120         # Seconds a client request waits for the leader's answer (also the /forward_batch deadline)
+FORWARD_BATCH_MEMORY = 1024   # Answered batch ids a leader remembers, so a re-sent batch is not committed twice
+PROPOSAL_ATTEMPTS = 3         # Consensus rounds a leader runs for one block while received blocks keep moving the tip
+
+# Asynchronous submission (see tx_status.py)
+TX_STATUS_CAPACITY = 100000   # Submission records kept for GET /tx/<id>
+TX_LONG_POLL_MAX = 60         # Longest a GET /tx/<id>?wait=N request may block, in seconds
+
+# Admission control on client write endpoints (see admission.py)
+ADMISSION_RATE = 100.0          # Requests per second each client may sustain (0 disables rate limiting)
+ADMISSION_BURST = 200           # Requests a client may send at once before being limited
+ADMISSION_MAX_IN_FLIGHT = 64    # Write requests served at once
+ADMISSION_QUEUE_SIZE = 256      # Requests waiting for a slot (or async submissions awaiting a batch) before new ones are refused
+ADMISSION_QUEUE_TIMEOUT = 30    # Seconds a request waits for a slot before it is refused
+ADMISSION_MAX_CLIENTS = 10000   # Client buckets remembered (the least recently seen are forgotten)
+ADMISSION_CLIENT_HEADER = None  # Header naming the client behind a proxy, e.g. "X-Forwarded-For" (None: remote address)
+
+# Committed-block event stream (see events.py)
+EVENTS_QUEUE_SIZE = 256   # Blocks buffered per subscriber before it is dropped as too slow
+EVENTS_HEARTBEAT = 15     # Seconds between keepalive comments on an idle stream
+
+# Sharded mode (see shards.py)
+SHARD_COMMIT_INTERVAL = 5.0  # Seconds between super-node commits of shard tips to the main chain (0 disables)
+
+# Load-aware leader election (see load.py and HRBC.elect_cluster_leaders)
+LOAD_QUEUE_CAPACITY = 64    # Pending requests at which a node's queue counts as full
+LOAD_LATENCY_TARGET = 2.0   # Seconds of consensus latency that count as full load
+LOAD_LATENCY_ALPHA = 0.2    # EWMA weight of each new consensus latency sample
+LOAD_REPORT_TTL = 30        # Seconds a load report stays valid
+LOAD_HIGH_WATERMARK = 1.0   # Load at which a node is passed over for leadership
+LOAD_LOW_WATERMARK = 0.5    # Load it must report before it can lead again
 
 # JWT Secret Key
 SECRET_KEY = "secret-key-for-tokens"
 
+# Vote signatures: each node's private key and everyone's public keys, in its data directory (see quorum.py)
+VOTE_KEY_FILE = 'vote_key'
+VOTE_PUBLIC_KEYS_FILE = 'vote_keys.json'
+
 # Authorized Nodes for PoA (Only relevant for PoA)
-AUTHORIZED_NODES = ["node1", "node2"]  # Example authority nodes
+AUTHORIZED_NODES = ["node_5000", "node_5001"]  # Example authority nodes
+
+# Inter-node wire format (see wire.py)
+WIRE_COMPRESS_THRESHOLD = 16 * 1024  # Deflate payloads at least this many bytes
+
+# Catch-up of lagging nodes (see catchup.py)
+ORPHAN_POOL_SIZE = 256     # Out-of-order blocks held while waiting for their parent
+CATCHUP_CHUNK_SIZE = 100   # Blocks per range request
+CATCHUP_PARALLELISM = 4    # Range requests in flight at once
+CATCHUP_FETCH_TIMEOUT = 30  # Seconds allowed for one range request (height probes use the peer's adaptive deadline)
+
+# Block dissemination (see node_communication.disseminate_block)
+GOSSIP_FANOUT = 2  # Random peers each receiver forwards a new block to (0 disables gossip)
+GOSSIP_TTL = 1     # Gossip hops a block may travel beyond the cluster hierarchy
+
+# Duplicate suppression on block and vote ingress (see dedup.py)
+SEEN_CACHE_SIZE = 4096          # Recent ids remembered exactly
+SEEN_BLOOM_BITS = 1 << 20       # Bloom filter behind the LRU (0 disables)
+SEEN_BLOOM_HASHES = 7
+
+# Per-peer deadlines and circuit breaking (see peer_health.py)
+PEER_TIMEOUT_INITIAL = 5.0   # Seconds, until a peer's latency has been measured
+PEER_TIMEOUT_MIN = 0.5
+PEER_TIMEOUT_MAX = 30.0
+PEER_LATENCY_ALPHA = 0.125   # EWMA weight of each new latency sample
+PEER_FAILURE_THRESHOLD = 3   # Consecutive failures before a peer's circuit opens
+PEER_BACKOFF_INITIAL = 1.0   # Seconds before the first probe of an open circuit
+PEER_BACKOFF_MAX = 60.0
+
+# Memory accounting for /debug/memory (see memory.py)
+MEMORY_SAMPLE_SIZE = 64       # Entries sampled per structure to estimate its size
+TRACEMALLOC_FRAMES = 1        # Stack frames tracemalloc keeps per allocation
+TRACEMALLOC_SNAPSHOTS = 4     # Labelled tracemalloc snapshots kept for diffs
+
+# Span tracing (see tracing.py)
+TRACING_ENABLED = True
+TRACE_BUFFER_SIZE = 10000  # Most recent spans kept per node
+
+# Full-chain integrity verification (see chain_verify.py)
+VERIFY_WORKERS = 0          # Processes (0 = one per CPU core)
+VERIFY_SEGMENT_SIZE = 1000  # Blocks per segment handed to a worker
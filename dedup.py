@@ -0,0 +1,91 @@
+# dedup.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+from config import SEEN_CACHE_SIZE, SEEN_BLOOM_BITS, SEEN_BLOOM_HASHES
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys.
+
+    It is cleared once it has taken as many keys as it was sized for, which
+    keeps the false-positive rate bounded at the cost of forgetting old keys.
+    """
+
+    def __init__(self, num_bits=SEEN_BLOOM_BITS, num_hashes=SEEN_BLOOM_HASHES):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = max(num_bits // 10, 1)  # ~10 bits per key keeps false positives near 1%
+        self.bits = bytearray((num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode()).digest()
+        for i in range(self.num_hashes):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], 'big') % self.num_bits
+
+    def add(self, key):
+        if self.count >= self.capacity:
+            self.bits = bytearray(len(self.bits))
+            self.count = 0
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenCache:
+    """Bounded LRU of recently seen message ids, optionally backed by a Bloom filter.
+
+    The LRU answers exactly for recent ids and can carry a value (for example
+    the outcome of the first delivery). Ids that have aged out of the LRU are
+    still remembered by the Bloom filter, but because it can give false
+    positives a Bloom hit only counts when `confirm(key)` agrees.
+    """
+
+    def __init__(self, max_size=SEEN_CACHE_SIZE, bloom_bits=SEEN_BLOOM_BITS):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.bloom = BloomFilter(bloom_bits) if bloom_bits else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None, confirm=None):
+        """Return the value stored for `key`, True for a confirmed Bloom hit, or `default`."""
+        if not key:
+            return default
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            in_bloom = self.bloom is not None and self.bloom.might_contain(key)
+        if in_bloom and confirm is not None and confirm(key):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return default
+
+    def seen(self, key, confirm=None):
+        return self.get(key, confirm=confirm) is not None
+
+    def add(self, key, value=True):
+        if not key:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            if self.bloom is not None:
+                self.bloom.add(key)
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -1,65 +1,114 @@
 # deploy_nodes.py
 
+import argparse
+import concurrent.futures
 import subprocess
 import sys
 import time
 import os
-import signal
+import requests
+import quorum
 
 node_processes = []  # List to keep track of all node processes
 
-def generate_peers_file(node_port, starting_port, number_of_nodes, data_dir):
-    """Generates a peers.txt file listing all other node addresses."""
-    peers = [f"127.0.0.1:{port}" for port in range(starting_port, starting_port + number_of_nodes) if port != node_port]
-    peers_file = os.path.join(data_dir, 'peers.txt')
-    with open(peers_file, 'w') as f:
-        for peer in peers:
-            f.write(f"{peer}\n")
+def node_data_dir(node_id):
+    return os.path.join('node_data', f'node_{node_id}')
 
-def start_node(port, node_id, starting_port, number_of_nodes):
-    """Starts a blockchain node on the specified port with unique data directory and logging."""
-    try:
-        # Create unique data directory for the node
-        data_dir = os.path.join('node_data', f'node_{node_id}')
+def write_all_peers_files(starting_port, number_of_nodes):
+    """Creates every node's data directory, peers.txt and vote keys in one pass, before any node starts."""
+    addresses = [f"127.0.0.1:{port}" for port in range(starting_port, starting_port + number_of_nodes)]
+    for index, port in enumerate(range(starting_port, starting_port + number_of_nodes)):
+        data_dir = node_data_dir(f'node_{port}')
         os.makedirs(data_dir, exist_ok=True)
-        
-        # Generate peers.txt
-        generate_peers_file(port, starting_port, number_of_nodes, data_dir)
-        
-        # Define log file path
-        log_file = os.path.join('logs', f'node_{node_id}.log')
-        os.makedirs('logs', exist_ok=True)
-        
-        # Launch the node process and track it
-        with open(log_file, 'w') as f:
-            process = subprocess.Popen([sys.executable, 'app.py', str(port), data_dir], stdout=f, stderr=f)
-            node_processes.append(process)  # Store process in the list
-        
-        print(f"Node {node_id} started on port {port} with data directory '{data_dir}' and logging to '{log_file}'")
-    except Exception as e:
-        print(f"Failed to start node {node_id} on port {port}: {e}")
+        with open(os.path.join(data_dir, 'peers.txt'), 'w') as f:
+            f.writelines(f"{address}\n" for address in addresses[:index] + addresses[index + 1:])
+    node_ids = [f'node_{port}' for port in range(starting_port, starting_port + number_of_nodes)]
+    quorum.write_key_files({node_id: node_data_dir(node_id) for node_id in node_ids})
 
-def main():
-    number_of_nodes = 10  # Specify the number of nodes you want to simulate
-    starting_port = 5000   # Starting port number
-    
-    for i in range(number_of_nodes):
-        port = starting_port + i
+def launch_node(port, node_id, data_dir, extra_args=()):
+    """Launches one node process with its output going to logs/node_<node_id>.log."""
+    log_file = os.path.join('logs', f'node_{node_id}.log')
+    os.makedirs('logs', exist_ok=True)
+    with open(log_file, 'w') as f:
+        process = subprocess.Popen([sys.executable, 'app.py', str(port), data_dir, *extra_args], stdout=f, stderr=f)
+    node_processes.append(process)  # Store process in the list
+    return log_file
+
+def start_cluster(starting_port, number_of_nodes, extra_args=(), workers=32):
+    """Writes all peers files, then launches every node concurrently. Returns the node URLs."""
+    write_all_peers_files(starting_port, number_of_nodes)
+    ports = list(range(starting_port, starting_port + number_of_nodes))
+
+    def launch(port):
         node_id = f'node_{port}'
-        start_node(port, node_id, starting_port, number_of_nodes)
-        time.sleep(1)  # Optional: Wait a bit before starting the next node
-    
-    print(f"Successfully started {number_of_nodes} nodes.")
+        try:
+            launch_node(port, node_id, node_data_dir(node_id), extra_args)
+        except Exception as e:
+            print(f"Failed to start node {node_id} on port {port}: {e}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(launch, ports))
+    print(f"Launched {len(node_processes)} node processes on ports {ports[0]}-{ports[-1]}.")
+    return [f"http://127.0.0.1:{port}" for port in ports]
+
+def wait_until_ready(urls, timeout=60, workers=32):
+    """Polls GET /healthz on every node until all answer or the deadline passes.
+
+    Returns the URLs that were still not ready at the deadline (empty when the cluster is up).
+    """
+    deadline = time.time() + timeout
+    pending = set(urls)
+
+    def probe(url):
+        try:
+            return url if requests.get(f"{url}/healthz", timeout=1).status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending and time.time() < deadline:
+            pending.difference_update(url for url in executor.map(probe, list(pending)) if url)
+            if pending:
+                time.sleep(0.2)
+    return sorted(pending)
+
+def stop_cluster(grace_period=10):
+    """Terminates every node at once, then waits for them together; stragglers are killed."""
+    for process in node_processes:
+        process.terminate()  # Gracefully terminate each node process
+    deadline = time.time() + grace_period
+    for process in node_processes:
+        try:
+            process.wait(timeout=max(0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    node_processes.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Start a local cluster of blockchain nodes.")
+    parser.add_argument('--nodes', type=int, default=10, help="Number of nodes to start")
+    parser.add_argument('--starting-port', type=int, default=5000, help="Port of the first node; the rest follow it")
+    parser.add_argument('--ready-timeout', type=float, default=60, help="Seconds to wait for every node to pass /healthz")
+    parser.add_argument('node_args', nargs=argparse.REMAINDER, help="Extra arguments passed to every app.py, after --")
+    args = parser.parse_args()
+    extra_args = [arg for arg in args.node_args if arg != '--']
+
+    started = time.time()
+    urls = start_cluster(args.starting_port, args.nodes, extra_args)
+    not_ready = wait_until_ready(urls, args.ready_timeout)
+    if not_ready:
+        print(f"{len(not_ready)} node(s) not ready after {args.ready_timeout}s: {', '.join(not_ready)}")
+    else:
+        print(f"Successfully started {args.nodes} nodes; all ready in {time.time() - started:.1f}s.")
 
     try:
         while True:
             time.sleep(1)  # Keep the script running
     except KeyboardInterrupt:
         print("\nShutting down all nodes...")
-        for process in node_processes:
-            process.terminate()  # Gracefully terminate each node process
-            process.wait()       # Wait for the process to finish cleanup
+        stop_cluster()
         print("All nodes have been terminated.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
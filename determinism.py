@@ -0,0 +1,53 @@
+# determinism.py
+
+import hashlib
+import random
+import threading
+
+_state = {'seed': None, 'shared_seed': None, 'node_id': None}
+_node_rngs = {}
+_lock = threading.Lock()
+
+
+def configure(seed, node_id, shared_seed=None):
+    """Enable seeded mode for this process (seed=None keeps the usual unseeded randomness).
+
+    `shared_seed` seeds only the shared streams when `seed` is None, for
+    modes in which nodes must agree on clusters and leaders; the per-node
+    streams (votes, gossip, ZKP challenges) then stay unseeded.
+    """
+    with _lock:
+        _state['seed'] = seed
+        _state['shared_seed'] = seed if seed is not None else shared_seed
+        _state['node_id'] = node_id
+        _node_rngs.clear()
+
+
+def is_seeded():
+    return _state['seed'] is not None
+
+
+def _derive(seed, *scope):
+    material = repr((seed,) + tuple(str(part) for part in scope)).encode('utf-8')
+    return int.from_bytes(hashlib.sha256(material).digest()[:8], 'big')
+
+
+def shared_rng(*scope):
+    """A generator every node derives identically from (seed, *scope).
+
+    Used for values the nodes must agree on, e.g. the reputation of a given
+    node id. Without a seed or shared seed, it is a fresh system-seeded generator.
+    """
+    if _state['shared_seed'] is None:
+        return random.Random()
+    return random.Random(_derive(_state['shared_seed'], *scope))
+
+
+def node_rng(name):
+    """This node's own stream for `name`, seeded from (seed, node_id, name) and reused across calls."""
+    with _lock:
+        rng = _node_rngs.get(name)
+        if rng is None:
+            rng = random.Random(_derive(_state['seed'], _state['node_id'], name)) if is_seeded() else random.Random()
+            _node_rngs[name] = rng
+        return rng
@@ -0,0 +1,97 @@
+# events.py
+
+import json
+import logging
+import queue
+import threading
+from config import EVENTS_QUEUE_SIZE, EVENTS_HEARTBEAT
+
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class BlockEventHub:
+    """Fans committed blocks out to /events/blocks subscribers.
+
+    Each subscriber has a bounded queue. `publish` never blocks: a subscriber
+    whose queue is full is dropped, and its stream ends with a `dropped`
+    event. The client can then reconnect with Last-Event-ID to resume.
+    """
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.stats_counters = {'published': 0, 'dropped_subscribers': 0}
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, height, block):
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.stats_counters['published'] += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait((height, block))
+            except queue.Full:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                with self.lock:
+                    self.stats_counters['dropped_subscribers'] += 1
+                logging.warning(f"[Events] Dropped a slow subscriber at height {height}.")
+
+    def stats(self):
+        with self.lock:
+            return {'subscribers': len(self.subscribers), **self.stats_counters}
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_blocks(blockchain, hub, from_height=None, heartbeat=EVENTS_HEARTBEAT):
+    """Server-sent events for committed blocks, optionally starting with the history from `from_height`.
+
+    The subscription is opened before the history is read, so no block
+    committed in between is missed; any that were already sent from history
+    are skipped when they come through the live queue.
+    """
+    subscriber = hub.subscribe()
+    try:
+        last_sent = None
+        if from_height is not None:
+            with blockchain.lock:
+                start = max(from_height, blockchain.base_height)
+                end = blockchain.get_height() + 1
+            # Committed blocks never change, so the history can be streamed from the chain store outside the lock
+            for height, block_data in zip(range(start, end), blockchain.iter_block_dicts(start, end)):
+                yield format_event('block', {'height': height, 'block': block_data}, height)
+                last_sent = height
+
+        while not subscriber.dropped:
+            try:
+                height, block = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keepalive\n\n"  # Lets the server notice clients that went away
+                continue
+            if last_sent is not None and height <= last_sent:
+                continue
+            yield format_event('block', {'height': height, 'block': block.to_dict()}, height)
+            last_sent = height
+
+        yield format_event('dropped', {'message': "Subscriber fell too far behind", 'last_height': last_sent})
+    finally:
+        hub.unsubscribe(subscriber)
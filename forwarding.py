@@ -0,0 +1,290 @@
+# forwarding.py
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import requests
+from config import (FORWARD_BATCH_SIZE, FORWARD_BATCH_WINDOW, FORWARD_RETRIES, FORWARD_REROUTES, FORWARD_TIMEOUT,
+                    FORWARD_BATCH_MEMORY)
+from node_communication import peer_address, disseminate_block, announce_selection_async
+import peer_health
+import load
+import wire
+
+_commit_lock = threading.Lock()  # One forwarded batch at a time becomes a block on the leader
+
+
+class NotLeader(Exception):
+    """Raised by commit_batch when leadership moved away while the batch waited for its turn."""
+
+    def __init__(self, leader):
+        super().__init__(f"{leader} leads now")
+        self.leader = leader
+
+
+def leader_for(blockchain):
+    """The node that may propose blocks on behalf of this node, or None if there is none."""
+    consensus = blockchain.consensus
+    if getattr(consensus, 'clusters', None):
+        cluster_id = consensus.get_cluster_id(blockchain.id)
+        return consensus.cluster_leaders.get(cluster_id) if cluster_id is not None else None
+    if getattr(consensus, 'authorized_nodes', None):
+        return consensus.next_sealer(blockchain)  # PoA: the authority whose turn it is
+    return None
+
+
+def should_forward(blockchain):
+    leader = leader_for(blockchain)
+    return leader is not None and leader != blockchain.id
+
+
+def register_transaction(blockchain, user_id, hashed_password):
+    """The on-chain register transaction, carrying the user's public commitment C = g^H mod p."""
+    return {"action": "register", "user_id": user_id,
+            "commitment": pow(blockchain.g, int(hashed_password), blockchain.p)}
+
+
+def commit_batch(blockchain, items):
+    """Commit forwarded requests as one block. Returns one (body, status) per item, in order.
+
+    Items are {'kind': 'register' | 'add_block', 'payload': <original request body>}.
+    Raises NotLeader, before committing anything, if this node no longer leads
+    by the time the batch gets the commit lock.
+    """
+    results = [None] * len(items)
+    transactions, owners, registering = [], [], set()
+    for index, item in enumerate(items):
+        payload = item.get('payload') or {}
+        if item.get('kind') == 'register':
+            user_id = payload.get('userId')
+            if user_id is None or 'hashedPassword' not in payload:
+                results[index] = ({"message": "Invalid input"}, 400)
+                continue
+            if user_id in blockchain.user_commitments or user_id in registering:
+                results[index] = ({"message": "User already registered"}, 400)
+                continue
+            try:
+                transaction = register_transaction(blockchain, user_id, payload['hashedPassword'])
+            except (TypeError, ValueError):
+                results[index] = ({"message": "Invalid input"}, 400)  # A bad password must not sink the whole batch
+                continue
+            registering.add(user_id)
+            transactions.append(transaction)
+        else:
+            user_id = payload.get('user_id')
+            transactions.append(payload.get('transaction'))
+        owners.append((index, item.get('kind'), user_id, payload))
+
+    if not transactions:
+        return results
+
+    with load.pending_work(len(transactions)), _commit_lock:
+        if should_forward(blockchain):
+            raise NotLeader(leader_for(blockchain))
+        if len(transactions) == 1:
+            _, kind, user_id, payload = owners[0]
+            commitment = transactions[0]['commitment'] if kind == 'register' else payload.get('commitment')
+            new_block, consensus_id = blockchain.add_block(user_id, transactions[0], commitment)
+        else:
+            new_block, consensus_id = blockchain.add_block("batch", transactions, None)
+
+    if not new_block:
+        logging.error(f"[Forwarding] Failed to commit a batch of {len(transactions)} transactions.")
+        for index, kind, _, _ in owners:
+            results[index] = ({"message": "Failed to add registration block" if kind == 'register' else "Failed to add block"}, 500 if kind == 'register' else 400)
+        return results
+
+    disseminate_block(blockchain, new_block, consensus_id)
+    announce_selection_async(blockchain, new_block)
+    leaves = new_block.get_merkle_tree().leaves
+    block_data = new_block.to_dict()
+    for position, (index, kind, user_id, payload) in enumerate(owners):
+        if kind == 'register':
+            blockchain.user_db[user_id] = payload['hashedPassword']
+        message = "Registration successful" if kind == 'register' else "Block added"
+        results[index] = ({"message": message, "block": block_data, "tx_ids": [leaves[position]]}, 200)
+    logging.info(f"[Forwarding] Committed {len(transactions)} transactions in block {new_block.hash}.")
+    return results
+
+
+class BatchLog:
+    """The leader's answers to recently committed forwarded batches, by batch id.
+
+    A follower whose connection dropped mid-batch cannot tell whether the
+    batch was committed, so it may send it again under the same id. The
+    leader answers the repeat from here, waiting for the first delivery if
+    that is still being committed, instead of committing the batch twice.
+    Only committed batches (status 200) are remembered; a batch refused with
+    409 may be sent again once leadership has settled.
+    """
+
+    def __init__(self, max_size=FORWARD_BATCH_MEMORY):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # batch id -> {'done': Event, 'answer': (payload, status)}
+        self.lock = threading.Lock()
+
+    def run(self, batch_id, handle):
+        """Return handle()'s (payload, status) for the first delivery of `batch_id`, the same answer for repeats.
+
+        Returns None for a repeat whose first delivery has not finished within FORWARD_TIMEOUT.
+        """
+        if not batch_id:
+            return handle()
+        with self.lock:
+            entry = self.entries.get(batch_id)
+            first = entry is None
+            if first:
+                entry = self.entries[batch_id] = {'done': threading.Event(), 'answer': None}
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        if not first:
+            logging.info(f"[Forwarding] Batch {batch_id} was sent again; answering from the first delivery.")
+            entry['done'].wait(FORWARD_TIMEOUT)
+            return entry['answer']
+        try:
+            entry['answer'] = handle()
+        finally:
+            if entry['answer'] is None or entry['answer'][1] != 200:
+                with self.lock:
+                    self.entries.pop(batch_id, None)  # Nothing was committed; a later delivery starts afresh
+            entry['done'].set()
+        return entry['answer']
+
+
+class Forwarder:
+    """Coalesces requests a follower cannot serve into batches for its cluster leader.
+
+    Requests are queued with `enqueue` (or `submit`, which blocks for the
+    answer) and a single flusher thread gathers up to FORWARD_BATCH_SIZE of
+    them, or whatever arrives within FORWARD_BATCH_WINDOW seconds, and posts
+    them to /forward_batch on the leader. The leader is looked up again for
+    every attempt, so a change of leadership is picked up on the next batch or
+    retry; a leader that answers 409 names the node it believes leads now. On
+    the leader itself, queued requests (async submissions) are committed
+    locally in the same batches.
+
+    Each batch carries an id that stays the same across retries, and the
+    leader deduplicates on it (see BatchLog). The leader mines before it
+    answers, so the post waits up to FORWARD_TIMEOUT rather than the peer's
+    adaptive deadline. A batch whose answer timed out is not retried, since it
+    may still be committed; its requests are answered 504.
+    """
+
+    def __init__(self, blockchain, batch_size=FORWARD_BATCH_SIZE, window=FORWARD_BATCH_WINDOW,
+                 retries=FORWARD_RETRIES, reroutes=FORWARD_REROUTES):
+        self.blockchain = blockchain
+        self.batch_size = batch_size
+        self.window = window
+        self.retries = retries
+        self.reroutes = reroutes
+        self.queue = queue.Queue()
+        self.started = False
+        self.start_lock = threading.Lock()
+        self.stats = {'forwarded': 0, 'batches': 0, 'reroutes': 0, 'failed': 0}
+
+    def enqueue(self, kind, payload, callback):
+        """Queue one request; `callback((body, status))` runs on the flusher thread once it is answered."""
+        self.start()
+        self.queue.put({'kind': kind, 'payload': payload, 'callback': callback})
+
+    def submit(self, kind, payload, timeout=FORWARD_TIMEOUT):
+        """Forward one request and wait for the leader's answer. Returns (body, status)."""
+        done = threading.Event()
+        answer = {}
+
+        def callback(result):
+            answer['result'] = result
+            done.set()
+
+        self.enqueue(kind, payload, callback)
+        if not done.wait(timeout):
+            return {"message": "Timed out waiting for the cluster leader"}, 504
+        return answer['result']
+
+    def start(self):
+        with self.start_lock:
+            if not self.started:
+                threading.Thread(target=self.run, daemon=True).start()
+                self.started = True
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.send(batch)
+            except Exception as e:
+                logging.error(f"[Forwarding] Batch failed: {e}")
+                results = [({"message": "Internal Server Error", "error": str(e)}, 500)] * len(batch)
+            for pending, result in zip(batch, results):
+                try:
+                    pending['callback'](result)
+                except Exception as e:
+                    logging.error(f"[Forwarding] Result callback failed: {e}")
+
+    def send(self, batch):
+        items = [{'kind': pending['kind'], 'payload': pending['payload']} for pending in batch]
+        self.stats['batches'] += 1
+        self.stats['forwarded'] += len(items)
+        batch_id = f"{self.blockchain.id}:{uuid.uuid4().hex}"
+        hint = None
+        failures = reroutes = 0  # Unreachable leaders and leadership changes are budgeted separately
+        while failures <= self.retries and reroutes <= self.reroutes:
+            leader = hint or leader_for(self.blockchain)
+            hint = None
+            if leader is None or leader == self.blockchain.id:
+                try:
+                    return commit_batch(self.blockchain, items)  # This node leads (async submission or a leadership change)
+                except NotLeader as e:
+                    hint = e.leader
+                    reroutes += 1
+                    self.stats['reroutes'] += 1
+                    logging.info(f"[Forwarding] Leadership moved to {hint} while the batch was queued; re-routing.")
+                    continue
+            peer = peer_address(self.blockchain, leader)
+            if peer is None:
+                break
+            try:
+                response = wire.post(peer, '/forward_batch', {'items': items, 'batch_id': batch_id, 'sender': self.blockchain.id,
+                                                              'load': load.local_report()}, timeout=FORWARD_TIMEOUT)
+                body = wire.read_response(peer, response)
+                load.observe(body.get('load'))
+                if response.status_code == 409:
+                    hint = body.get('leader') if body.get('leader') != leader else None
+                    self.stats['reroutes'] += 1
+                    logging.info(f"[Forwarding] {leader} no longer leads; re-routing (hint: {hint}).")
+                    # The hinted node may not have the block that handed it the lead yet; give it a moment
+                    time.sleep(min(0.05 * 2 ** reroutes, 1.0))
+                    reroutes += 1
+                    continue
+                response.raise_for_status()
+                block_data = body.get('block')
+                results = []
+                for result in body['results']:
+                    if result['status'] == 200 and block_data is not None:
+                        result['body']['block'] = block_data
+                    result['body']['forwarded_to'] = leader
+                    results.append((result['body'], result['status']))
+                return results
+            except requests.exceptions.ReadTimeout as e:
+                # The leader got the batch but did not answer in time; it may still commit it
+                logging.warning(f"[Forwarding] Leader {leader} did not answer batch {batch_id} in time: {e}")
+                self.stats['failed'] += len(items)
+                return [({"message": "Timed out waiting for the cluster leader; the request may still be committed"}, 504)] * len(items)
+            except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+                logging.warning(f"[Forwarding] Attempt {failures + 1} to reach leader {leader} failed: {e}")
+                time.sleep(min(0.1 * 2 ** failures, 1.0))
+                failures += 1
+        self.stats['failed'] += len(items)
+        return [({"message": "Cluster leader unavailable"}, 503)] * len(items)
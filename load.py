@@ -0,0 +1,121 @@
+# load.py
+
+import threading
+import time
+from contextlib import contextmanager
+from config import LOAD_QUEUE_CAPACITY, LOAD_LATENCY_TARGET, LOAD_LATENCY_ALPHA, LOAD_REPORT_TTL
+
+# Load signals of this node and the latest reports heard from its peers.
+#
+# A node's load is the largest of three ratios, each 1.0 at capacity: pending
+# requests over LOAD_QUEUE_CAPACITY, smoothed consensus latency over
+# LOAD_LATENCY_TARGET, and the fraction of a core the process has been busy.
+# Reports ride along on messages that are sent anyway (vote requests and
+# ballots, block broadcasts and their acknowledgements, forwarded batches),
+# and a proposer seals the fresh ones it holds into its block so that every
+# node applies the same reports at the same height (see HRBC.elect_cluster_leaders).
+
+_node_id = None
+_lock = threading.Lock()
+_pending = 0
+_queue_probes = []
+_latency = None
+_latency_at = 0.0
+_cpu = {'wall': time.monotonic(), 'cpu': time.process_time(), 'value': 0.0}
+_reports = {}  # node id -> latest report received
+
+
+def set_node(node_id):
+    global _node_id
+    _node_id = node_id
+
+
+def add_queue_probe(probe):
+    """Count `probe()` (e.g. a queue's qsize) toward this node's pending requests."""
+    _queue_probes.append(probe)
+
+
+@contextmanager
+def pending_work(count=1):
+    """Count `count` requests as pending while the block runs."""
+    global _pending
+    with _lock:
+        _pending += count
+    try:
+        yield
+    finally:
+        with _lock:
+            _pending -= count
+
+
+def record_latency(seconds):
+    global _latency, _latency_at
+    with _lock:
+        _latency = seconds if _latency is None else _latency + LOAD_LATENCY_ALPHA * (seconds - _latency)
+        _latency_at = time.monotonic()
+
+
+def queue_depth():
+    with _lock:
+        depth = _pending
+    return depth + sum(probe() for probe in _queue_probes)
+
+
+def consensus_latency():
+    """Smoothed consensus latency; a node that has not run consensus lately reports none."""
+    with _lock:
+        if _latency is None or time.monotonic() - _latency_at > LOAD_REPORT_TTL:
+            return 0.0
+        return _latency
+
+
+def cpu_utilization(min_interval=1.0):
+    """Share of one core this process has used since the previous sample (resampled at most every `min_interval` s)."""
+    with _lock:
+        wall, cpu = time.monotonic(), time.process_time()
+        if wall - _cpu['wall'] >= min_interval:
+            _cpu['value'] = (cpu - _cpu['cpu']) / (wall - _cpu['wall'])
+            _cpu['wall'], _cpu['cpu'] = wall, cpu
+        return _cpu['value']
+
+
+def score(queue, latency, cpu):
+    return max(queue / LOAD_QUEUE_CAPACITY, latency / LOAD_LATENCY_TARGET, cpu)
+
+
+def local_report():
+    queue, latency, cpu = queue_depth(), consensus_latency(), cpu_utilization()
+    return {'node': _node_id, 'load': round(score(queue, latency, cpu), 3), 'queue': queue,
+            'latency': round(latency, 3), 'cpu': round(cpu, 3), 'ts': round(time.time(), 3)}
+
+
+def observe(report):
+    """Keep a peer's report if it is newer than the one held."""
+    if not isinstance(report, dict) or not report.get('node') or report['node'] == _node_id:
+        return
+    with _lock:
+        held = _reports.get(report['node'])
+        if held is None or report.get('ts', 0) > held.get('ts', 0):
+            _reports[report['node']] = report
+
+
+def observe_all(reports):
+    for report in reports or []:
+        observe(report)
+
+
+def fresh_reports():
+    """This node's report and every peer report younger than LOAD_REPORT_TTL."""
+    now = time.time()
+    with _lock:
+        reports = [report for report in _reports.values() if now - report.get('ts', 0) <= LOAD_REPORT_TTL]
+    return [local_report()] + reports
+
+
+def block_loads():
+    """The compact form a proposer seals into its block: {node id: [load, report time]}."""
+    return {report['node']: [report['load'], report['ts']] for report in fresh_reports() if report.get('node')}
+
+
+def snapshot():
+    return {'local': local_report(), 'peers': fresh_reports()[1:]}
@@ -0,0 +1,134 @@
+# memory.py
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from config import MEMORY_SAMPLE_SIZE, TRACEMALLOC_FRAMES, TRACEMALLOC_SNAPSHOTS
+
+# Approximate memory accounting for /debug/memory.
+#
+# A structure's size is estimated from a fixed number of evenly spaced
+# entries, so a report costs the same whatever the chain height. Objects
+# shared between structures (a block in both `chain.hot` and `orphans`)
+# are counted in each, so the figures are for spotting growth, not for
+# adding up to the RSS.
+
+_snapshots = OrderedDict()  # label -> (taken at, tracemalloc.Snapshot), oldest first
+_lock = threading.Lock()
+
+
+def deep_size(obj, seen=None, depth=4):
+    """getsizeof of `obj` plus what it references, `depth` levels down."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen, depth - 1) + deep_size(value, seen, depth - 1) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen, depth - 1) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen, depth - 1)
+    return size
+
+
+def estimate(container, sample_size=MEMORY_SAMPLE_SIZE):
+    """{'entries', 'bytes'} for a dict, list, deque or set, extrapolated from up to `sample_size` entries."""
+    items = list(container.items()) if isinstance(container, dict) else list(container)  # Copied under the GIL
+    if not items:
+        return {'entries': 0, 'bytes': sys.getsizeof(container)}
+    sample = items[::max(len(items) // sample_size, 1)][:sample_size]
+    per_entry = sum(deep_size(item) for item in sample) / len(sample)
+    return {'entries': len(items), 'bytes': int(sys.getsizeof(container) + per_entry * len(items))}
+
+
+def rss_bytes():
+    """Resident set size from /proc, or None where that is not available."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def report(structures, counts=None):
+    """Sizes of the named containers, with any extra per-structure counts merged in."""
+    sizes = {}
+    for name, container in structures.items():
+        sizes[name] = estimate(container)
+        sizes[name].update((counts or {}).get(name, {}))
+    return {'rss_bytes': rss_bytes(), 'structures': sizes, 'tracemalloc': tracemalloc_status()}
+
+
+def tracemalloc_status():
+    status = {'tracing': tracemalloc.is_tracing(), 'snapshots': list(_snapshots)}
+    if status['tracing']:
+        status['current_bytes'], status['peak_bytes'] = tracemalloc.get_traced_memory()
+    return status
+
+
+def start_tracing(frames=TRACEMALLOC_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing():
+    """Stop tracing; stored snapshots are dropped with it."""
+    with _lock:
+        _snapshots.clear()
+    tracemalloc.stop()
+
+
+def current_snapshot():
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing")
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def take_snapshot(label=None):
+    """Store a snapshot under `label` (default: the time), keeping the TRACEMALLOC_SNAPSHOTS most recent."""
+    snapshot = current_snapshot()
+    label = label or f"{time.time():.0f}"
+    with _lock:
+        _snapshots.pop(label, None)
+        _snapshots[label] = (time.time(), snapshot)
+        while len(_snapshots) > TRACEMALLOC_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return label, snapshot
+
+
+def format_stat(stat, diff=False):
+    entry = {'where': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+    if diff:
+        entry.update(bytes_diff=stat.size_diff, count_diff=stat.count_diff)
+    return entry
+
+
+def top_allocations(limit=20, group_by='lineno'):
+    """The current largest allocation sites."""
+    return [format_stat(stat) for stat in current_snapshot().statistics(group_by)[:limit]]
+
+
+def diff(since, until=None, limit=20, group_by='lineno'):
+    """Allocation sites that grew most between snapshot `since` and `until` (default: now).
+
+    Returns None if either label is unknown.
+    """
+    with _lock:
+        older = _snapshots.get(since)
+        newer = _snapshots.get(until) if until else None
+    if older is None or (until and newer is None):
+        return None
+    if newer is None:
+        newer = (time.time(), current_snapshot())
+    stats = newer[1].compare_to(older[1], group_by)
+    return {'since': since, 'until': until or 'now', 'seconds': round(newer[0] - older[0], 3),
+            'top': [format_stat(stat, diff=True) for stat in stats[:limit]]}
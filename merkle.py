@@ -0,0 +1,76 @@
+# merkle.py
+
+import hashlib
+import json
+
+# Leaves and internal nodes are hashed under different prefixes, so an
+# internal node can never be passed off as a leaf (second preimage).
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_transaction(transaction, previous_hash=None, index=0):
+    """Calculate the SHA-256 id of a single transaction (its Merkle leaf).
+
+    The id also covers the block's `previous_hash` and the transaction's
+    position in it, so identical transactions committed in different blocks
+    (or twice in one block) get distinct ids.
+    """
+    tx_string = json.dumps([previous_hash, index, transaction], sort_keys=True).encode()
+    return hashlib.sha256(LEAF_PREFIX + tx_string).hexdigest()
+
+
+def hash_pair(left, right):
+    """Hash two child nodes into their parent node."""
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+class MerkleTree:
+    """Binary Merkle tree over a list of transaction ids.
+
+    An unpaired node at the end of a level is promoted to the next level
+    unchanged, so no leaf is ever duplicated.
+    """
+
+    def __init__(self, leaves):
+        self.leaves = list(leaves)
+        self.levels = [self.leaves]
+        level = self.leaves
+        while len(level) > 1:
+            next_level = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2 == 1:
+                next_level.append(level[-1])
+            self.levels.append(next_level)
+            level = next_level
+
+    @property
+    def root(self):
+        if not self.leaves:
+            return hashlib.sha256(b'').hexdigest()
+        return self.levels[-1][0]
+
+    def get_proof(self, index):
+        """Return the sibling path from leaf `index` up to the root."""
+        if index < 0 or index >= len(self.leaves):
+            raise IndexError(f"Leaf index {index} out of range")
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append({
+                    'hash': level[sibling],
+                    'position': 'left' if sibling < index else 'right',
+                })
+            index //= 2
+        return proof
+
+
+def verify_proof(tx_id, proof, merkle_root):
+    """Check an inclusion proof produced by `MerkleTree.get_proof`."""
+    current = tx_id
+    for step in proof:
+        if step['position'] == 'left':
+            current = hash_pair(step['hash'], current)
+        else:
+            current = hash_pair(current, step['hash'])
+    return current == merkle_root
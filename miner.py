@@ -0,0 +1,222 @@
+# miner.py
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from block import Block
+from config import DIFFICULTY_LEVEL, MINER_WORKERS, MINER_BATCH
+
+
+def meets_difficulty(block_hash, difficulty=DIFFICULTY_LEVEL):
+    return block_hash.startswith("0" * difficulty)
+
+
+def search_nonces(prefix, difficulty, start, step, stop_event, results, batch=MINER_BATCH):
+    """Try nonces start, start + step, ... until one meets `difficulty` or `stop_event` is set.
+
+    `prefix` is hashed once; each attempt copies that state and hashes only the
+    nonce. Runs unchanged in a worker process or in the calling thread.
+    """
+    base = hashlib.sha256(prefix)
+    zero_bytes = bytes(difficulty // 2)
+    odd = difficulty % 2
+    nonce = start
+    while not stop_event.is_set():
+        for _ in range(batch):
+            attempt = base.copy()
+            attempt.update(str(nonce).encode())
+            digest = attempt.digest()
+            if digest[:len(zero_bytes)] == zero_bytes and (not odd or digest[len(zero_bytes)] < 16):
+                results.put(nonce)
+                stop_event.set()
+                return
+            nonce += step
+
+
+def worker_loop(jobs, results, stop_event):
+    """A pool process: run nonce searches from `jobs` until it receives None.
+
+    Every job ends with ('idle', job_id) on `results`, after ('found', job_id,
+    nonce) if this worker found the solution.
+    """
+    found = queue.Queue()
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, prefix, difficulty, start, step = job
+        search_nonces(prefix, difficulty, start, step, stop_event, found)
+        while not found.empty():
+            results.put(('found', job_id, found.get()))
+        results.put(('idle', job_id))
+
+
+class Miner:
+    """Proof-of-work nonce search spread over a pool of worker processes.
+
+    The pool is started on the first block and reused for the node's
+    lifetime, so a block costs a job hand-off rather than a process start per
+    worker. Worker i tries nonces i, i + n, i + 2n, ... so the pool never
+    repeats work. As soon as one finds a solution, or `stop()` is called (for
+    example from /select_node), every worker is told to stop.
+    """
+
+    def __init__(self, difficulty=DIFFICULTY_LEVEL, workers=MINER_WORKERS):
+        self.difficulty = difficulty
+        self.workers = workers or os.cpu_count() or 1
+        self.stop_requested = threading.Event()
+        self.last_hashrate = 0.0
+        self.mining_on = None  # previous_hash of the block being mined
+        self.lock = threading.Lock()  # One block at a time on the pool
+        self.pool = None
+        self.job_id = 0
+
+    def stop(self, previous_hash=None):
+        """Stop the current search; with `previous_hash`, only if the block being mined has that parent."""
+        if previous_hash is None or previous_hash == self.mining_on:
+            self.stop_requested.set()
+            return True
+        return False
+
+    def start_pool(self):
+        context = multiprocessing.get_context()
+        jobs = [context.Queue() for _ in range(self.workers)]
+        results, stop_event = context.Queue(), context.Event()
+        processes = [context.Process(target=worker_loop, args=(jobs[i], results, stop_event), daemon=True)
+                     for i in range(self.workers)]
+        for process in processes:
+            process.start()
+        self.pool = {'jobs': jobs, 'results': results, 'stop_event': stop_event, 'processes': processes}
+        logging.info(f"[Miner] Started a pool of {self.workers} worker processes.")
+
+    def close(self):
+        with self.lock:
+            if self.pool is None:
+                return
+            for jobs in self.pool['jobs']:
+                jobs.put(None)
+            for process in self.pool['processes']:
+                process.join(timeout=1)
+            self.pool = None
+
+    def mine(self, block):
+        """Find a nonce for `block` and update its nonce and hash. Returns False if stopped first."""
+        with self.lock:
+            self.stop_requested.clear()
+            self.mining_on = block.previous_hash
+            prefix = Block.header_prefix(block.get_header())
+            started = time.monotonic()
+            try:
+                nonce = self.search_in_thread(prefix) if self.workers == 1 else self.search_in_pool(prefix)
+            finally:
+                self.mining_on = None
+
+        elapsed = time.monotonic() - started
+        if nonce is None:
+            logging.info(f"[Miner] Mining stopped after {elapsed:.2f}s.")
+            return False
+
+        block.nonce = nonce
+        block.hash = block.calculate_hash()
+        self.last_hashrate = nonce / elapsed if elapsed > 0 else 0.0  # Roughly the attempts made across all workers
+        logging.debug(f"[Miner] Found nonce {nonce} in {elapsed:.2f}s (~{self.last_hashrate:.0f} H/s) with {self.workers} workers.")
+        return True
+
+    def search_in_thread(self, prefix):
+        stop_event, results = threading.Event(), queue.Queue()
+        worker = threading.Thread(target=search_nonces, args=(prefix, self.difficulty, 0, 1, stop_event, results))
+        worker.start()
+        nonce = None
+        try:
+            while nonce is None and not self.stop_requested.is_set() and worker.is_alive():
+                try:
+                    nonce = results.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            if nonce is None and not results.empty():
+                nonce = results.get()
+        finally:
+            stop_event.set()
+            worker.join()
+        return nonce
+
+    def search_in_pool(self, prefix):
+        if self.pool is None or not all(process.is_alive() for process in self.pool['processes']):
+            if self.pool is not None:
+                logging.warning("[Miner] A worker process died; restarting the pool.")
+                for process in self.pool['processes']:
+                    process.kill()
+            self.start_pool()
+        pool = self.pool
+        self.job_id += 1
+        job_id = self.job_id
+        pool['stop_event'].clear()  # Every worker went idle at the end of the previous job
+        for i, jobs in enumerate(pool['jobs']):
+            jobs.put((job_id, prefix, self.difficulty, i, self.workers))
+
+        nonce, idle = None, 0
+        try:
+            while nonce is None and idle < self.workers and not self.stop_requested.is_set():
+                try:
+                    message = pool['results'].get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if message[1] != job_id:
+                    continue
+                if message[0] == 'found':
+                    nonce = message[2]
+                else:
+                    idle += 1
+        finally:
+            pool['stop_event'].set()
+            # Wait until every worker is idle again, so none is still searching when the next job starts
+            while idle < self.workers:
+                try:
+                    message = pool['results'].get(timeout=5)
+                except queue.Empty:
+                    logging.warning("[Miner] Workers did not go idle; restarting the pool.")
+                    for process in pool['processes']:
+                        process.kill()
+                    self.pool = None
+                    break
+                if message[1] != job_id:
+                    continue
+                if message[0] == 'found' and nonce is None:
+                    nonce = message[2]
+                elif message[0] == 'idle':
+                    idle += 1
+        return nonce
+
+
+def measure(worker_counts, difficulty, blocks):
+    """Average hashrate of mining `blocks` blocks at `difficulty` with each worker count."""
+    report = []
+    for workers in worker_counts:
+        miner = Miner(difficulty, workers)
+        miner.mine(Block("warmup", "0", "warmup", None, timestamp=0))  # Starts the pool outside the timing
+        attempts, started = 0, time.monotonic()
+        for index in range(blocks):
+            block = Block("bench", str(index), f"transaction {index}", None, timestamp=index)
+            miner.mine(block)
+            attempts += block.nonce + 1
+        elapsed = time.monotonic() - started
+        miner.close()
+        report.append({'workers': workers, 'hashrate': attempts / elapsed, 'seconds_per_block': elapsed / blocks})
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Measure proof-of-work hashrate against the number of workers")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--difficulty', type=int, default=DIFFICULTY_LEVEL)
+    parser.add_argument('--blocks', type=int, default=20)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPU cores, difficulty {args.difficulty}, {args.blocks} blocks per run")
+    print(f"{'workers':>8} {'hashes/s':>12} {'s/block':>9}")
+    for row in measure(sorted(set(args.workers)), args.difficulty, args.blocks):
+        print(f"{row['workers']:>8} {row['hashrate']:>12.0f} {row['seconds_per_block']:>9.3f}")
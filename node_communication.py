@@ -1,22 +1,103 @@
 
 # node_communication.py
 
+import determinism
 import requests
-from config import AUTHORITY_NODE_URL
+import threading
+import time
+from config import AUTHORITY_NODE_URL, GOSSIP_FANOUT, GOSSIP_TTL
+from block import Block
+import wire
+import peer_health
+import load
+import tracing
 import logging
 
 def sync_blockchain():
     logging.debug("Attempting to synchronize blockchain with authority node.")
     try:
-        response = requests.get(f'{AUTHORITY_NODE_URL}/sync_blockchain')
+        authority = AUTHORITY_NODE_URL.split('://')[-1]
+        response = wire.get(authority, '/sync_blockchain')
         response.raise_for_status()  # Raise an exception for HTTP errors
-        chain = response.json()
+        chain = wire.read_response(authority, response)
         logging.info(f"Synchronized blockchain: {chain}")
     except requests.exceptions.RequestException as e:
         logging.error(f"Error during blockchain synchronization: {e}")
         logging.debug("Traceback:", exc_info=True)
 
-def broadcast_block(peer_nodes, block, consensus_id):
+class LightClient:
+    """Follows a node's chain by header only and fetches block bodies on demand.
+
+    Each header is checked by recomputing its hash and by its `previous_hash`
+    link to the header before it, so a tip can be tracked without ever
+    downloading transactions.
+    """
+
+    def __init__(self, node_url=AUTHORITY_NODE_URL, batch_size=500):
+        self.node_url = node_url
+        self.batch_size = batch_size
+        self.headers = []
+
+    def get_height(self):
+        return len(self.headers) - 1
+
+    def get_tip(self):
+        return self.headers[-1] if self.headers else None
+
+    def verify_header(self, header, previous_header):
+        if Block.hash_header(header) != header['hash']:
+            logging.warning(f"[LightClient] Header {header.get('height')} has a bad hash.")
+            return False
+        if previous_header is not None and header['previous_hash'] != previous_header['hash']:
+            logging.warning(f"[LightClient] Header {header.get('height')} does not link to its parent.")
+            return False
+        return True
+
+    def sync_headers(self):
+        """Download and verify headers past the local tip. Returns the new height."""
+        logging.debug(f"[LightClient] Syncing headers from {self.node_url} starting at {len(self.headers)}.")
+        try:
+            while True:
+                response = requests.get(
+                    f'{self.node_url}/headers',
+                    params={'start': len(self.headers), 'count': self.batch_size},
+                    timeout=10,
+                )
+                response.raise_for_status()
+                batch = response.json()['headers']
+                if not batch:
+                    break
+                for header in batch:
+                    if not self.verify_header(header, self.get_tip()):
+                        return self.get_height()
+                    self.headers.append(header)
+                if len(batch) < self.batch_size:
+                    break
+            logging.info(f"[LightClient] Header chain synced to height {self.get_height()}.")
+        except requests.exceptions.RequestException as e:
+            logging.error(f"[LightClient] Error during header synchronization: {e}")
+            logging.debug("Traceback:", exc_info=True)
+        return self.get_height()
+
+    def fetch_block(self, height):
+        """Fetch a full block body and check it against the verified header."""
+        if height < 0 or height >= len(self.headers):
+            return None
+        try:
+            response = requests.get(f'{self.node_url}/block/{height}', timeout=10)
+            response.raise_for_status()
+            block = Block.from_dict(response.json())
+        except requests.exceptions.RequestException as e:
+            logging.error(f"[LightClient] Error fetching block {height}: {e}")
+            logging.debug("Traceback:", exc_info=True)
+            return None
+        if block.hash != self.headers[height]['hash']:
+            logging.warning(f"[LightClient] Block {height} does not match its header.")
+            return None
+        return block
+
+@tracing.traced('broadcast_block')
+def broadcast_block(peer_nodes, block, consensus_id, relay_cluster=False, gossip_ttl=0):
     logging.debug(f"Broadcasting block to peers: {peer_nodes} with consensus_id: {consensus_id}")
     block_data = {
         'user_id': block.user_id,
@@ -25,35 +106,117 @@ def broadcast_block(peer_nodes, block, consensus_id):
         'nonce': block.nonce,
         'commitment': block.commitment,
         'timestamp': block.timestamp,
+        'proposer': block.proposer,
+        'loads': block.loads,
+        'certificate': block.certificate,
+        'load': load.local_report(),     # The sender's own load, for the receiver's view
         'consensus_node': consensus_id,
+        'relay_cluster': relay_cluster,  # Receiver should pass the block on to its cluster
+        'gossip_ttl': gossip_ttl,        # Remaining epidemic gossip hops
     }
 
     for node in peer_nodes:
         try:
-            response = requests.post(f'http://{node}/receive_block', json=block_data, timeout=100)
+            response = wire.post(node, '/receive_block', block_data)
             response.raise_for_status()  # Raise an exception for HTTP errors
+            load.observe(wire.read_response(node, response).get('load'))
             logging.info(f"Block broadcasted to {node}")
+        except peer_health.PeerUnavailable:
+            logging.debug(f"Skipping {node}: circuit open.")
         except requests.exceptions.HTTPError as http_err:
             logging.warning(f"Failed to broadcast block to {node}. HTTP Error: {http_err.response.status_code} - {http_err.response.reason}")
         except requests.exceptions.RequestException as e:
             logging.error(f"Error broadcasting to {node}: {e}")
             logging.debug("Traceback:", exc_info=True)
 
-def broadcast_node_selection_complete(peer_nodes, consensus_id, stop_time):
+def peer_address(blockchain, node_id):
+    """Maps a node id such as 'node_5001' to its peer address."""
+    port = node_id.split('_')[-1]
+    for peer in blockchain.peer_nodes:
+        if peer.split(':')[-1] == port:
+            return peer
+    return None
+
+def cluster_members(blockchain):
+    """Addresses of the other members of this node's cluster (empty without clusters)."""
+    consensus = blockchain.consensus
+    if not getattr(consensus, 'clusters', None):
+        return []
+    cluster_id = consensus.get_cluster_id(blockchain.id)
+    members = [peer_address(blockchain, node_id) for node_id in consensus.clusters.get(cluster_id, [])
+               if node_id != blockchain.id]
+    return [peer for peer in members if peer]
+
+@tracing.traced('disseminate_block')
+def disseminate_block(blockchain, block, consensus_id):
+    """Sends a newly committed block through the HRBC hierarchy instead of to every peer.
+
+    The proposer sends the block to the other cluster leaders, which relay it
+    within their own clusters, and to the members of its own cluster. Every
+    receiver of a new block additionally gossips it to GOSSIP_FANOUT random
+    peers while the TTL lasts. Consensus algorithms without clusters fall back
+    to a direct broadcast.
+    """
+    consensus = blockchain.consensus
+    if not getattr(consensus, 'clusters', None):
+        broadcast_block(blockchain.peer_nodes, block, consensus_id)
+        return
+
+    own_cluster = consensus.get_cluster_id(blockchain.id)
+    leaders = [peer_address(blockchain, leader) for cluster_id, leader in consensus.cluster_leaders.items()
+               if cluster_id != own_cluster and leader != blockchain.id]
+    leaders = [peer for peer in leaders if peer]
+    logging.debug(f"Disseminating block {block.hash} to leaders {leaders} and cluster {cluster_members(blockchain)}")
+    broadcast_block(leaders, block, consensus_id, relay_cluster=True, gossip_ttl=GOSSIP_TTL)
+    broadcast_block(cluster_members(blockchain), block, consensus_id, gossip_ttl=GOSSIP_TTL)
+
+@tracing.traced('relay_block')
+def relay_block(blockchain, block, block_data):
+    """Passes on a block this node has just accepted, as instructed by the sender."""
+    consensus_id = block_data.get('consensus_node')
+    exclude = {peer_address(blockchain, consensus_id) if consensus_id else None}
+    gossip_ttl = max(int(block_data.get('gossip_ttl') or 0) - 1, 0)
+
+    if block_data.get('relay_cluster'):
+        members = [peer for peer in cluster_members(blockchain) if peer not in exclude]
+        broadcast_block(members, block, consensus_id, gossip_ttl=gossip_ttl)
+        exclude.update(members)
+
+    if block_data.get('gossip_ttl') and GOSSIP_FANOUT > 0:
+        candidates = [peer for peer in blockchain.peer_nodes if peer not in exclude]
+        targets = determinism.node_rng('gossip').sample(candidates, min(GOSSIP_FANOUT, len(candidates)))
+        broadcast_block(targets, block, consensus_id, gossip_ttl=gossip_ttl)
+
+def relay_block_async(blockchain, block, block_data):
+    """Relays on a background thread so the sender's request is not held up."""
+    threading.Thread(target=tracing.propagate(relay_block), args=(blockchain, block, block_data), daemon=True).start()
+
+def announce_selection_async(blockchain, block):
+    """Tells the other cluster leaders, the only nodes that mine, to stop competing with a block we just committed."""
+    consensus = blockchain.consensus
+    if not getattr(consensus, 'cluster_leaders', None):
+        return
+    leaders = [peer_address(blockchain, leader) for leader in set(consensus.cluster_leaders.values()) if leader != blockchain.id]
+    leaders = [peer for peer in leaders if peer]
+    threading.Thread(target=tracing.propagate(broadcast_node_selection_complete),
+                     args=(leaders, blockchain.id, time.time(), block.previous_hash), daemon=True).start()
+
+def broadcast_node_selection_complete(peer_nodes, consensus_id, stop_time, previous_hash=None):
     logging.debug(f"Broadcasting node selection completion to peers: {peer_nodes} with consensus_id: {consensus_id}")
     for node in peer_nodes:
-        url = f'http://{node}/select_node'
-        payload = {'consensus_id': consensus_id, "stop_time": stop_time}
-        headers = {'Content-Type': 'application/json'}
+        payload = {'consensus_id': consensus_id, "stop_time": stop_time, "previous_hash": previous_hash}
 
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = wire.post(node, '/select_node', payload)
             response.raise_for_status()  # Raise an exception for HTTP errors
+            wire.read_response(node, response)
 
             if response.status_code == 200:
                 logging.info(f"Successfully notified {node} to stop mining.")
             else:
                 logging.warning(f"Failed to notify {node}. Status Code: {response.status_code} - {response.reason}")
+        except peer_health.PeerUnavailable:
+            logging.debug(f"Skipping {node}: circuit open.")
         except requests.exceptions.HTTPError as http_err:
             logging.warning(f"Failed to notify {node}. HTTP Error: {http_err.response.status_code} - {http_err.response.reason}")
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,119 @@
+# peer_health.py
+
+import threading
+import time
+import requests
+from config import (PEER_TIMEOUT_INITIAL, PEER_TIMEOUT_MIN, PEER_TIMEOUT_MAX, PEER_LATENCY_ALPHA,
+                    PEER_FAILURE_THRESHOLD, PEER_BACKOFF_INITIAL, PEER_BACKOFF_MAX)
+
+
+class PeerUnavailable(requests.exceptions.RequestException):
+    """Raised instead of sending a request to a peer whose circuit is open."""
+
+
+class PeerHealth:
+    """Latency tracker and circuit breaker for a single peer.
+
+    Request deadlines follow the peer's smoothed latency (EWMA of latency and
+    of its deviation, as TCP does for retransmission timeouts). After
+    PEER_FAILURE_THRESHOLD consecutive failures the circuit opens and the peer
+    is skipped; once the backoff has elapsed one probe request is let through,
+    closing the circuit on success or doubling the backoff on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self):
+        self.latency = None
+        self.deviation = 0.0
+        self.failures = 0
+        self.state = self.CLOSED
+        self.backoff = PEER_BACKOFF_INITIAL
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def timeout(self):
+        if self.latency is None:
+            return PEER_TIMEOUT_INITIAL
+        return min(max(self.latency + 4 * self.deviation, PEER_TIMEOUT_MIN), PEER_TIMEOUT_MAX)
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN  # Let exactly one probe through
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+                self.deviation = latency / 2
+            else:
+                self.deviation += PEER_LATENCY_ALPHA * (abs(latency - self.latency) - self.deviation)
+                self.latency += PEER_LATENCY_ALPHA * (latency - self.latency)
+            self.failures = 0
+            self.state = self.CLOSED
+            self.backoff = PEER_BACKOFF_INITIAL
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.backoff = min(self.backoff * 2, PEER_BACKOFF_MAX)
+            if self.state == self.HALF_OPEN or self.failures >= PEER_FAILURE_THRESHOLD:
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + self.backoff
+
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'latency': self.latency,
+            'timeout': self.timeout(),
+            'failures': self.failures,
+            'backoff': self.backoff,
+        }
+
+
+_peers = {}
+_peers_lock = threading.Lock()
+
+
+def get(peer):
+    """Return the PeerHealth for `peer` (host:port), creating it on first use."""
+    with _peers_lock:
+        if peer not in _peers:
+            _peers[peer] = PeerHealth()
+        return _peers[peer]
+
+
+def snapshot():
+    with _peers_lock:
+        peers = dict(_peers)
+    return {peer: health.to_dict() for peer, health in peers.items()}
+
+
+def tracked_request(method, peer, url, timeout=None, **kwargs):
+    """Send a request to `peer` with an adaptive deadline, recording the outcome.
+
+    Raises PeerUnavailable without touching the network if the peer's
+    circuit is open. `timeout` overrides the adaptive deadline.
+    """
+    health = get(peer)
+    if not health.allow_request():
+        raise PeerUnavailable(f"Circuit open for {peer}")
+    start = time.monotonic()
+    try:
+        response = requests.request(method, url, timeout=timeout or health.timeout(), **kwargs)
+    except requests.exceptions.RequestException:
+        health.record_failure()
+        raise
+    if response.status_code >= 500:
+        health.record_failure()
+    else:
+        health.record_success(time.monotonic() - start)
+    return response
@@ -0,0 +1,156 @@
+# quorum.py
+
+import hashlib
+import json
+import os
+import secrets
+from config import VOTE_KEY_FILE, VOTE_PUBLIC_KEYS_FILE
+
+# Votes are Schnorr signatures in a 2048-bit prime field with a 256-bit
+# prime-order subgroup (GROUP_P = k*GROUP_Q + 1, GROUP_G of order GROUP_Q).
+# Each node signs with its own private key and everyone verifies with the
+# public keys in VOTE_PUBLIC_KEYS_FILE, so holding the verification keys does
+# not let a node vote on another's behalf.
+
+GROUP_P = int(
+    'dad6b89cd64b868828aed06271bcc34c62c9fd61b22e77fef7b44e7ada9ca550'
+    '77ea07c331238d6e51a2aee6758e33cd6047bd0d9ad5496df2cc329a75c0e242'
+    'b4855cc3351ee7fdf434de12f5f68c81d4a960cc2dedb8d55d7aea8c912435b0'
+    'a04d1a734b8ffad714752715fca2f8e2bc20e6b7ef43c883186dbe1c2aa7d977'
+    'd85bac0e196fc781a58084ca9ab28f82b34e902991f892644501451e0f50e134'
+    '1ffa24ad7085872699144f40735ce7380c4e9785cb296f86c21b0112f0ebabd3'
+    'f816784a06882afb1e74cf22f975d461ad2177065838f8bc86e32dbf6f49e8f9'
+    '7b940d1ab82e6d1c0124346056fa41177187a5b440762e9bb42e8e83def65999', 16)
+GROUP_Q = int(
+    'ecb947b16da0264fdcfa6a545755f72e3e9daec34142850b49e654e8d69ac8b3', 16)
+GROUP_G = int(
+    'bbc442e220577168db072da48b511ebaef1983c8be2422bb0aaa8382a2901bb0'
+    'c9aed8520f46646069b35acdd5406d24ffbbc3ef78ace79944e0194d4d168322'
+    '7f6242cb4cb84a0626fe93dfd659537f0cb1d4ae279fd615a19dcd0c34d70c78'
+    '5d9d5e6fdd3cf72a6da55170573448e1aac3419f3bd5809365e1a6f85421a83b'
+    '43b6459f4594a5e5ea49839cac58af1b56bb06e555494e7220a49ced19a75bc6'
+    '7f78479607d7bff629d31cad8f19c8471ad987961e37279a72ed16909b3b195d'
+    '82222da2cf3be9e905fa007079e1fc6f5ea2e4ac209f7cfb24a30e33fe25c571'
+    '917dfaf98275e59eb93d101421b5b855ee100e2e131276f3b939981ce5c94309', 16)
+
+_node_id = None
+_private_key = None
+_public_keys = {}  # node id -> public key
+
+
+def generate_key():
+    """A fresh (private, public) key pair."""
+    private = secrets.randbelow(GROUP_Q - 1) + 1
+    return private, pow(GROUP_G, private, GROUP_P)
+
+
+def write_key_files(data_dirs):
+    """Give every node in {node_id: data_dir} its private key and the public keys of all of them.
+
+    Run once before the nodes start, the way their peers.txt files are written.
+    """
+    keys = {node_id: generate_key() for node_id in data_dirs}
+    public_keys = {node_id: format(public, 'x') for node_id, (_, public) in keys.items()}
+    for node_id, data_dir in data_dirs.items():
+        os.makedirs(data_dir, exist_ok=True)
+        with open(os.path.join(data_dir, VOTE_KEY_FILE), 'w') as f:
+            f.write(format(keys[node_id][0], 'x'))
+        with open(os.path.join(data_dir, VOTE_PUBLIC_KEYS_FILE), 'w') as f:
+            json.dump(public_keys, f)
+
+
+def load_keys(data_dir, node_id):
+    """Read this node's private key and the cluster's public keys from `data_dir`.
+
+    Missing files leave the node unable to sign, or to accept the votes of the
+    nodes it has no key for; they are written by deploy_nodes (see write_key_files).
+    """
+    global _node_id, _private_key, _public_keys
+    _node_id = node_id
+    try:
+        with open(os.path.join(data_dir, VOTE_KEY_FILE)) as f:
+            _private_key = int(f.read().strip(), 16)
+        with open(os.path.join(data_dir, VOTE_PUBLIC_KEYS_FILE)) as f:
+            _public_keys = {node: int(public, 16) for node, public in json.load(f).items()}
+    except (OSError, ValueError) as e:
+        return False, str(e)
+    if pow(GROUP_G, _private_key, GROUP_P) != _public_keys.get(node_id):
+        return False, f"the private key does not match the public key listed for {node_id}"
+    return True, None
+
+
+def challenge(commitment, message):
+    digest = hashlib.sha256(f"{commitment:x}:{message}".encode()).digest()
+    return int.from_bytes(digest, 'big') % GROUP_Q
+
+
+def quorum_size(number_of_leaders):
+    """Yes votes, the proposer's included, needed to commit a block among `number_of_leaders` cluster leaders."""
+    return max((2 * number_of_leaders) // 3, 1)
+
+
+def sign_vote(block_hash, scope='vote'):
+    """This node's signed yes vote for `block_hash`, as '<challenge>:<response>' in hex.
+
+    `scope` names what is being voted on ('vote' for the main chain,
+    'shard<N>' for shard N), so a vote cannot be replayed in another one.
+    The nonce is derived from the key and the message, so signing the same
+    vote twice gives the same signature.
+    """
+    if _private_key is None:
+        raise RuntimeError("no vote key loaded")
+    message = f"{scope}:{block_hash}"
+    nonce_digest = hashlib.sha256(f"{_private_key:x}:{message}".encode()).digest()
+    nonce = int.from_bytes(nonce_digest, 'big') % (GROUP_Q - 1) + 1
+    e = challenge(pow(GROUP_G, nonce, GROUP_P), message)
+    s = (nonce + _private_key * e) % GROUP_Q
+    return f"{e:x}:{s:x}"
+
+
+def verify_vote(node_id, block_hash, signature, scope='vote'):
+    """True if `signature` is `node_id`'s vote for `block_hash`; nodes without a known public key never verify."""
+    public = _public_keys.get(node_id)
+    if public is None or not isinstance(signature, str):
+        return False
+    try:
+        e, s = (int(part, 16) for part in signature.split(':'))
+    except ValueError:
+        return False
+    if not (0 <= e < GROUP_Q and 0 <= s < GROUP_Q):
+        return False
+    commitment = pow(GROUP_G, s, GROUP_P) * pow(public, GROUP_Q - e, GROUP_P) % GROUP_P
+    return challenge(commitment, f"{scope}:{block_hash}") == e
+
+
+def make_certificate(block_hash, signatures, number_of_leaders, quorum=None):
+    """Bundle the yes votes gathered for a block: {'block_hash', 'quorum', 'votes': {node_id: signature}}."""
+    return {'block_hash': block_hash, 'quorum': quorum or quorum_size(number_of_leaders), 'votes': dict(signatures)}
+
+
+def verify_certificate(certificate, block, signers, number_of_leaders, quorum=None, scope='vote'):
+    """Check a block's quorum certificate. Returns (ok, reason).
+
+    The proposer must be among the signers, every signer must be in `signers`
+    (the nodes entitled to vote on this block, e.g. the cluster leaders at its
+    height), and there must be at least `quorum` valid votes (by default
+    quorum_size(number_of_leaders)), as computed by the verifier itself rather
+    than taken from the certificate.
+    """
+    quorum = quorum or quorum_size(number_of_leaders)
+    if not certificate:
+        return False, 'missing certificate'
+    if certificate.get('block_hash') != block.hash:
+        return False, 'certificate is for another block'
+    votes = certificate.get('votes') or {}
+    if block.proposer not in votes:
+        return False, 'proposer did not sign'
+    valid = 0
+    for node_id, signature in votes.items():
+        if node_id not in signers:
+            return False, f'{node_id} may not vote on this block'
+        if not verify_vote(node_id, block.hash, signature, scope):
+            return False, f'bad vote from {node_id}'
+        valid += 1
+    if valid < quorum:
+        return False, f'{valid} votes, quorum is {quorum}'
+    return True, None
@@ -0,0 +1,160 @@
+# replay.py
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+import requests
+from benchmark import percentile
+from config import ADMISSION_CLIENT_HEADER
+
+# Client-facing endpoints whose inbound requests make up a workload
+RECORDED_ENDPOINTS = {'register', 'initiate_zkp', 'verify_zkp', 'authenticate', 'process_request', 'add_block'}
+
+# Request headers that change how a node handles a request (async submission, admission client id)
+RECORDED_HEADERS = ['Prefer'] + ([ADMISSION_CLIENT_HEADER] if ADMISSION_CLIENT_HEADER else [])
+
+
+def recorded_client(flask_request):
+    """The client id admission control charges the request to (see app.client_id)."""
+    if ADMISSION_CLIENT_HEADER and flask_request.headers.get(ADMISSION_CLIENT_HEADER):
+        return flask_request.headers[ADMISSION_CLIENT_HEADER].split(',')[0].strip()
+    return flask_request.remote_addr
+
+
+class Recorder:
+    """Appends inbound client requests, with their arrival time, to a JSONL trace file.
+
+    Each record keeps the query string, the RECORDED_HEADERS that were sent
+    and the client the node's admission control saw, so a replay exercises
+    the same async and rate-limiting paths.
+    """
+
+    def __init__(self, path, node):
+        self.path = path
+        self.node = node  # host:port the requests arrived at
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', buffering=1)  # Line-buffered so a killed node loses at most one record
+
+    def record(self, flask_request):
+        if flask_request.endpoint not in RECORDED_ENDPOINTS:
+            return
+        entry = {
+            'ts': time.time(),
+            'node': self.node,
+            'method': flask_request.method,
+            'path': flask_request.full_path.rstrip('?'),  # Flask appends '?' even without a query string
+            'headers': {name: flask_request.headers[name] for name in RECORDED_HEADERS if name in flask_request.headers},
+            'client': recorded_client(flask_request),
+            'body': flask_request.get_json(silent=True),
+        }
+        line = json.dumps(entry, sort_keys=True)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def load_trace(paths):
+    """Merge one or more recorded trace files into a single stream ordered by arrival time."""
+    entries = []
+    for path in paths:
+        with open(path) as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+def retarget(node, port_offset):
+    host, port = node.rsplit(':', 1)
+    return f"{host}:{int(port) + port_offset}"
+
+
+def send(entry, port_offset):
+    """Re-issue one recorded request. Returns (path, status or None, latency).
+
+    Where the target identifies clients by ADMISSION_CLIENT_HEADER, the
+    recorded client is sent in it, so each original client keeps its own
+    rate limit instead of all of them sharing the replaying host's.
+    """
+    url = f"http://{retarget(entry['node'], port_offset)}{entry['path']}"
+    headers = dict(entry.get('headers') or {})
+    if ADMISSION_CLIENT_HEADER and entry.get('client'):
+        headers.setdefault(ADMISSION_CLIENT_HEADER, entry['client'])
+    started = time.time()
+    try:
+        response = requests.request(entry['method'], url, json=entry['body'], headers=headers, timeout=100)
+        status = response.status_code
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"[Replay] {entry['method']} {url} failed: {e}")
+        status = None
+    return entry['path'].split('?')[0], status, time.time() - started
+
+
+def replay(entries, speed=1.0, port_offset=0, concurrency=64):
+    """Re-drive a recorded stream, keeping its inter-arrival gaps divided by `speed`.
+
+    speed=0 sends every request as soon as a worker is free. Requests are
+    issued from a pool, so a slow response does not delay the schedule.
+    """
+    if not entries:
+        return {'requests': 0}
+    results = []
+    started = time.time()
+    first_ts = entries[0]['ts']
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for entry in entries:
+            if speed > 0:
+                delay = (entry['ts'] - first_ts) / speed - (time.time() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(send, entry, port_offset))
+        for future in futures:
+            results.append(future.result())
+    elapsed = time.time() - started
+
+    latencies = [latency for _, status, latency in results if status is not None]
+    statuses = {}
+    for path, status, _ in results:
+        key = f"{path} {status}"
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(results),
+        'elapsed': elapsed,
+        'recorded_duration': entries[-1]['ts'] - first_ts,
+        'requests_per_sec': len(results) / elapsed if elapsed else None,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded client requests (app.py --record) against a cluster.")
+    parser.add_argument('traces', nargs='+', help="Trace files written by app.py --record")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Time compression factor: 1 = recorded pace, 10 = ten times faster, 0 = no waiting")
+    parser.add_argument('--port-offset', type=int, default=0,
+                        help="Add this to every recorded port, to replay against a cluster on other ports")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--output', help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+    entries = load_trace(args.traces)
+    print(f"Replaying {len(entries)} requests at {args.speed}x...")
+    report = replay(entries, args.speed, args.port_offset, args.concurrency)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# shards.py
+
+import concurrent.futures
+import hashlib
+import logging
+import threading
+import time
+import requests
+from block import Block
+from config import DIFFICULTY_LEVEL, SHARD_COMMIT_INTERVAL, FORWARD_TIMEOUT
+from miner import Miner, meets_difficulty
+from node_communication import peer_address
+from forwarding import NotLeader, commit_batch
+from quorum import sign_vote, verify_vote, make_certificate, verify_certificate
+import peer_health
+import wire
+import tracing
+
+FORWARD_HEADER = 'X-Forwarded-Shard'
+
+
+def shard_for(user_id, num_shards):
+    """Stable shard assignment: the same user always lands on the same shard, on every node."""
+    digest = hashlib.sha256(str(user_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+class ShardChain:
+    """The chain of one shard. Blocks are linked and mined like main-chain blocks."""
+
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        genesis = Block("genesis", "0", f"Shard {shard_id} Genesis", "genesis_commitment", timestamp=1, nonce="nonce")
+        self.chain = [genesis]
+        self.block_index = {genesis.hash: 0}
+        self.lock = threading.RLock()  # Held by the leader for a whole proposal round
+
+    def tip(self):
+        return self.chain[-1]
+
+    def get_height(self):
+        return len(self.chain) - 1
+
+    def has_block(self, block_hash):
+        return block_hash in self.block_index
+
+    def append(self, block):
+        self.block_index[block.hash] = len(self.chain)
+        self.chain.append(block)
+
+    def get_blocks(self, start=0, count=None):
+        end = len(self.chain) if count is None else min(len(self.chain), start + count)
+        return [block.to_dict() for block in self.chain[start:end]]
+
+
+class ShardManager:
+    """Sharded mode: one chain per HRBC cluster.
+
+    Transactions are routed to a shard by user_id hash. The shard's cluster
+    leader mines the block, collects a majority vote from its own cluster only,
+    and pushes the block to the cluster members, so shards commit in parallel
+    without an inter-cluster round. The super node periodically records every
+    shard's tip on the main chain, which acts as the coordinating chain.
+
+    Yes votes are signed for the shard (see quorum.sign_vote) and bundled
+    into the block's certificate. Members accept a pushed block only from the
+    current shard leader and only with a certificate signed by a majority of
+    the cluster; blocks fetched with sync_from may come from earlier leaders,
+    so for them the certificate alone is checked.
+    """
+
+    def __init__(self, blockchain, commit_interval=SHARD_COMMIT_INTERVAL):
+        self.blockchain = blockchain
+        self.consensus = blockchain.consensus
+        if not getattr(self.consensus, 'clusters', None):
+            raise ValueError("Sharded mode needs a clustered consensus such as HRBC")
+        self.num_shards = len(self.consensus.clusters)
+        own_shard = self.consensus.get_cluster_id(blockchain.id)
+        # A node stores only its own cluster's shard; other shards are reached through their leaders
+        self.chains = {own_shard: ShardChain(own_shard)} if own_shard is not None else {}
+        self.miner = Miner(DIFFICULTY_LEVEL)  # Separate from the main-chain miner so /select_node does not stop it
+        self.commit_interval = commit_interval
+        self.committed_tips = {}
+        self.stop_event = threading.Event()
+
+    def shard_for(self, user_id):
+        return shard_for(user_id, self.num_shards)
+
+    def leader(self, shard_id):
+        return self.consensus.cluster_leaders.get(shard_id)
+
+    def is_leader(self, shard_id):
+        return self.leader(shard_id) == self.blockchain.id
+
+    def peer_for(self, node_id):
+        return peer_address(self.blockchain, node_id) if node_id else None
+
+    def quorum(self, shard_id):
+        """Yes votes, the proposer's included, needed to commit a block to the shard."""
+        return len(self.consensus.clusters.get(shard_id, [])) // 2 + 1
+
+    @staticmethod
+    def vote_scope(shard_id):
+        return f"shard{shard_id}"
+
+    def members(self, shard_id):
+        """Addresses of the other nodes of the shard's cluster."""
+        members = [peer_address(self.blockchain, node_id) for node_id in self.consensus.clusters.get(shard_id, [])
+                   if node_id != self.blockchain.id]
+        return [peer for peer in members if peer]
+
+    @tracing.traced('shards.submit')
+    def submit(self, shard_id, user_id, transaction, commitment):
+        """Commit a transaction to a shard this node leads. Returns the block, or None if the round failed."""
+        chain = self.chains[shard_id]
+        with chain.lock:
+            block = Block(user_id, chain.tip().hash, transaction, commitment, timestamp=time.time(),
+                          proposer=self.blockchain.id)
+            with tracing.span('miner.mine', difficulty=DIFFICULTY_LEVEL, shard=shard_id):
+                if not self.miner.mine(block):
+                    return None
+            if not self.collect_votes(shard_id, block):
+                logging.warning(f"[Shards] Shard {shard_id} rejected block {block.hash}.")
+                return None
+            chain.append(block)
+            self.broadcast(shard_id, block)
+        logging.info(f"[Shards] Block {block.hash} committed to shard {shard_id} at height {chain.get_height()}.")
+        return block
+
+    def collect_votes(self, shard_id, block):
+        """Majority vote of the shard's cluster; the proposer counts as a yes.
+
+        On success the signed votes are attached to the block as its certificate.
+        """
+        scope = self.vote_scope(shard_id)
+        voters = [node_id for node_id in self.consensus.clusters.get(shard_id, []) if node_id != self.blockchain.id]
+        payload = {'shard_id': shard_id, 'block': block.to_dict()}
+
+        def request_vote(node_id):
+            peer = self.peer_for(node_id)
+            if peer is None:
+                return None
+            try:
+                response = wire.post(peer, '/shard/vote', payload)
+                response.raise_for_status()
+                body = wire.read_response(peer, response)
+            except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+                logging.warning(f"[Shards] No vote from {peer}: {e}")
+                return None
+            if not body.get('vote'):
+                return None
+            if not verify_vote(node_id, block.hash, body.get('signature'), scope):
+                logging.warning(f"[Shards] Ignoring unauthenticated vote from {node_id}.")
+                return None
+            return body['signature']
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(voters), 1)) as executor:
+            signatures = dict(zip(voters, executor.map(tracing.propagate(request_vote), voters)))
+        signatures = {node_id: signature for node_id, signature in signatures.items() if signature}
+        signatures[self.blockchain.id] = sign_vote(block.hash, scope)
+        if len(signatures) < self.quorum(shard_id):
+            return False
+        block.certificate = make_certificate(block.hash, signatures, None, quorum=self.quorum(shard_id))
+        return True
+
+    def broadcast(self, shard_id, block):
+        payload = {'shard_id': shard_id, 'block': block.to_dict()}
+
+        def send(peer):
+            try:
+                wire.post(peer, '/shard/receive_block', payload).raise_for_status()
+            except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+                logging.warning(f"[Shards] Failed to send shard block to {peer}: {e}")
+
+        members = self.members(shard_id)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(members), 1)) as executor:
+            list(executor.map(tracing.propagate(send), members))
+
+    def vote(self, shard_id, block):
+        """A member's ballot {'vote', 'signature'}: the block must come from the shard leader, extend our
+        shard tip and carry valid proof of work."""
+        chain = self.chains.get(shard_id)
+        if (chain is None or block.proposer != self.leader(shard_id) or block.previous_hash != chain.tip().hash
+                or not meets_difficulty(block.hash, DIFFICULTY_LEVEL)):
+            return {'vote': False, 'signature': None}
+        vote = self.consensus.vote_on_block(block)
+        return {'vote': vote, 'signature': sign_vote(block.hash, self.vote_scope(shard_id)) if vote else None}
+
+    def receive_block(self, shard_id, block, sender=None):
+        """Apply a block pushed by the shard leader. Returns a blockchain BLOCK_* status."""
+        chain = self.chains.get(shard_id)
+        if chain is None:
+            return self.blockchain.BLOCK_REJECTED
+        with chain.lock:
+            if chain.has_block(block.hash):
+                return self.blockchain.BLOCK_DUPLICATE
+            if block.proposer != self.leader(shard_id) or not self.is_valid(shard_id, block):
+                logging.warning(f"[Shards] Rejecting block {block.hash} for shard {shard_id} from {block.proposer}.")
+                return self.blockchain.BLOCK_REJECTED
+            if block.previous_hash != chain.tip().hash and sender:
+                self.sync_from(shard_id, sender)  # We missed blocks; fetch them from the leader
+                if chain.has_block(block.hash):
+                    return self.blockchain.BLOCK_ACCEPTED
+            if block.previous_hash != chain.tip().hash:
+                return self.blockchain.BLOCK_REJECTED
+            chain.append(block)
+        return self.blockchain.BLOCK_ACCEPTED
+
+    def is_valid(self, shard_id, block):
+        """Proof of work plus a certificate signed by a majority of the shard's cluster, the proposer included."""
+        if not meets_difficulty(block.hash, DIFFICULTY_LEVEL):
+            return False
+        valid, reason = verify_certificate(block.certificate, block, self.consensus.clusters.get(shard_id, []), None,
+                                           quorum=self.quorum(shard_id), scope=self.vote_scope(shard_id))
+        if not valid:
+            logging.warning(f"[Shards] Block {block.hash} for shard {shard_id}: {reason}")
+        return valid
+
+    def sync_from(self, shard_id, peer):
+        chain = self.chains[shard_id]
+        try:
+            response = wire.get(peer, f'/shard/{shard_id}/blocks', params={'start': chain.get_height() + 1})
+            response.raise_for_status()
+            blocks = wire.read_response(peer, response)['blocks']
+        except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+            logging.warning(f"[Shards] Could not sync shard {shard_id} from {peer}: {e}")
+            return
+        for block_data in blocks:
+            block = Block.from_dict(block_data)
+            if block.previous_hash != chain.tip().hash or not self.is_valid(shard_id, block):
+                logging.warning(f"[Shards] Stopped syncing shard {shard_id} at invalid block {block.hash}.")
+                return
+            chain.append(block)
+        logging.info(f"[Shards] Synced shard {shard_id} to height {chain.get_height()} from {peer}.")
+
+    def forward(self, shard_id, payload):
+        """Hand a transaction to the shard's leader. Returns (response body, status code)."""
+        leader = self.leader(shard_id)
+        peer = self.peer_for(leader)
+        if peer is None:
+            return {"message": "Shard leader unknown", "shard": shard_id}, 503
+        try:
+            # /add_block is a client endpoint and reads JSON only. The leader mines before it answers, which the
+            # adaptive deadline (sized for quick peer messages) would cut short
+            response = wire.post(peer, '/add_block', payload, timeout=FORWARD_TIMEOUT, headers={FORWARD_HEADER: str(shard_id)},
+                                 content_type=wire.JSON)
+            return wire.read_response(peer, response), response.status_code
+        except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+            logging.warning(f"[Shards] Could not forward to shard {shard_id} leader {leader}: {e}")
+            return {"message": "Shard leader unavailable", "shard": shard_id}, 503
+
+    def get_tip(self, shard_id):
+        """The shard tip as reported by its leader, or None if it cannot be read."""
+        chain = self.chains.get(shard_id)
+        if chain is not None and self.is_leader(shard_id):
+            return {'shard_id': shard_id, 'height': chain.get_height(), 'hash': chain.tip().hash}
+        peer = self.peer_for(self.leader(shard_id))
+        if peer:
+            try:
+                response = wire.get(peer, f'/shard/{shard_id}/tip')
+                response.raise_for_status()
+                return wire.read_response(peer, response)
+            except (peer_health.PeerUnavailable, requests.exceptions.RequestException) as e:
+                logging.warning(f"[Shards] Could not read shard {shard_id} tip from {peer}: {e}")
+        if chain is not None:
+            return {'shard_id': shard_id, 'height': chain.get_height(), 'hash': chain.tip().hash}
+        return None
+
+    def commit_tips(self):
+        """Record shard tips on the main chain. Only the super node does this, and only when a tip moved."""
+        if self.blockchain.id != self.consensus.super_node:
+            return None
+        tips = dict(self.committed_tips)  # A shard whose tip cannot be read keeps its last committed tip
+        for shard_id in range(self.num_shards):
+            tip = self.get_tip(shard_id)
+            if tip is not None:
+                tips[str(shard_id)] = tip
+        if tips == self.committed_tips:
+            return None
+        # Through commit_batch, so the tip commit is serialized with client requests on this leader
+        payload = {'user_id': self.blockchain.id, 'transaction': {"action": "shard_commit", "tips": tips}, 'commitment': None}
+        try:
+            body, status = commit_batch(self.blockchain, [{'kind': 'add_block', 'payload': payload}])[0]
+        except NotLeader:
+            return None  # No longer a cluster leader; the new super node takes over
+        if status != 200:
+            return None
+        self.committed_tips = tips
+        logging.info(f"[Shards] Committed shard tips to main chain block {body['block']['hash']}.")
+        return body['block']
+
+    def run_committer(self):
+        while not self.stop_event.wait(self.commit_interval):
+            try:
+                self.commit_tips()
+            except Exception as e:
+                logging.error(f"[Shards] Shard tip commit failed: {e}")
+
+    def start(self):
+        if self.commit_interval > 0:
+            threading.Thread(target=self.run_committer, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        return {
+            'shards': self.num_shards,
+            'leaders': {str(shard_id): leader for shard_id, leader in self.consensus.cluster_leaders.items()},
+            'local': {
+                str(shard_id): {
+                    'height': chain.get_height(),
+                    'tip': chain.tip().hash,
+                    'members': self.consensus.clusters.get(shard_id, []),
+                }
+                for shard_id, chain in self.chains.items()
+            },
+        }
@@ -0,0 +1,182 @@
+# snapshot.py
+
+import json
+import logging
+import os
+import requests
+from block import Block
+from config import SNAPSHOT_INTERVAL, SNAPSHOTS_TO_KEEP, SNAPSHOT_FETCH_TIMEOUT
+import wire
+
+
+class SnapshotManager:
+    """Writes and restores periodic snapshots of a node's derived state.
+
+    A snapshot holds everything a node would otherwise rebuild by replaying
+    the chain (reputation, consensus clusters, registered users and metric
+    aggregates) together with the block it corresponds to. Restoring one
+    leaves the node with that block as its chain base, so only the blocks
+    after it need to be fetched and replayed.
+
+    `user_db` (password hashes and pending ZKP commitments) is node-local: it
+    is kept in the snapshots on disk but never served to peers (see `public`).
+    """
+
+    def __init__(self, blockchain, interval=SNAPSHOT_INTERVAL, keep=SNAPSHOTS_TO_KEEP):
+        self.blockchain = blockchain
+        self.interval = interval
+        self.keep = keep
+        self.snapshot_dir = os.path.join(blockchain.data_dir, 'snapshots')
+
+    def maybe_snapshot(self, height):
+        """Write a snapshot if `height` falls on the snapshot interval.
+
+        Called once a block is fully processed (see Blockchain.commit_block),
+        so the snapshot includes the reputation and metric updates of the
+        block it is taken at.
+        """
+        if not self.interval or height <= 0 or height % self.interval != 0:
+            return None
+        try:
+            return self.write_snapshot(self.create_snapshot())
+        except Exception as e:
+            logging.error(f"[Snapshot] Failed to write snapshot at height {height}: {e}")
+            logging.debug("Traceback:", exc_info=True)
+            return None
+
+    def create_snapshot(self):
+        blockchain = self.blockchain
+        tip = blockchain.get_last_block()
+        consensus = getattr(blockchain, 'consensus', None)
+        return {
+            'height': blockchain.get_height(),
+            'block_hash': tip.hash,
+            'block': tip.to_dict(),
+            'reputation_tokens': blockchain.reputation_tokens,
+            'consensus_state': consensus.get_state() if hasattr(consensus, 'get_state') else None,
+            'user_db': blockchain.user_db,
+            'user_commitments': blockchain.user_commitments,
+            'metrics': {
+                'total_size': blockchain.metrics['total_size'],
+                'last_block_time': blockchain.last_block_time,
+            },
+        }
+
+    def write_snapshot(self, snapshot):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, f"snapshot_{snapshot['height']:012d}.json")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)  # Readers never see a partially written snapshot
+        logging.info(f"[Snapshot] Wrote snapshot at height {snapshot['height']} ({snapshot['block_hash']}).")
+
+        for old_path in self.list_snapshots()[:-self.keep]:
+            os.remove(old_path)
+        return path
+
+    def list_snapshots(self):
+        """Snapshot file paths on disk, oldest first."""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        names = sorted(name for name in os.listdir(self.snapshot_dir)
+                       if name.startswith('snapshot_') and name.endswith('.json'))
+        return [os.path.join(self.snapshot_dir, name) for name in names]
+
+    @staticmethod
+    def public(snapshot):
+        """The snapshot as served to peers, without node-local credentials."""
+        return {key: value for key, value in snapshot.items() if key != 'user_db'}
+
+    def load_latest(self):
+        """Return the newest snapshot on disk, or None."""
+        paths = self.list_snapshots()
+        if not paths:
+            return None
+        with open(paths[-1], 'r') as f:
+            return json.load(f)
+
+    def fetch_latest(self, peer):
+        """Download the newest snapshot a peer has, or None."""
+        try:
+            response = wire.get(peer, '/snapshot/latest', timeout=SNAPSHOT_FETCH_TIMEOUT)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return wire.read_response(peer, response)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"[Snapshot] Error fetching snapshot from {peer}: {e}")
+            logging.debug("Traceback:", exc_info=True)
+            return None
+
+    def restore(self, snapshot):
+        """Load a snapshot's state into the blockchain, making its block the chain base."""
+        blockchain = self.blockchain
+        anchor = Block.from_dict(snapshot['block'])
+        if anchor.hash != snapshot['block_hash']:
+            raise ValueError(f"Snapshot block does not hash to {snapshot['block_hash']}")
+
+        blockchain.reset_chain(anchor, snapshot['height'])
+        blockchain.reputation_tokens = snapshot['reputation_tokens']
+        blockchain.user_db = snapshot.get('user_db', {})  # Absent from snapshots fetched from a peer
+        blockchain.user_commitments = snapshot.get('user_commitments', {})
+        blockchain.metrics['total_size'] = snapshot['metrics']['total_size']
+        blockchain.last_block_time = snapshot['metrics']['last_block_time']
+        if snapshot.get('consensus_state') and hasattr(blockchain.consensus, 'load_state'):
+            blockchain.consensus.load_state(snapshot['consensus_state'])
+        logging.info(f"[Snapshot] Restored snapshot at height {snapshot['height']} ({snapshot['block_hash']}).")
+
+    def replay_tail(self, peer, batch_size=500):
+        """Fetch the blocks after the local tip from a peer and apply them. Returns the number applied.
+
+        Each block goes through Blockchain.receive_block, so it is validated by
+        the consensus plugin exactly as a block arriving over /receive_block.
+        """
+        blockchain = self.blockchain
+        applied = 0
+        while True:
+            try:
+                response = wire.get(peer, '/blocks', timeout=SNAPSHOT_FETCH_TIMEOUT,
+                                    params={'start': blockchain.get_height() + 1, 'count': batch_size})
+                response.raise_for_status()
+                batch = wire.read_response(peer, response)['blocks']
+            except requests.exceptions.RequestException as e:
+                logging.error(f"[Snapshot] Error fetching blocks from {peer}: {e}")
+                logging.debug("Traceback:", exc_info=True)
+                break
+
+            for block_data in batch:
+                block = Block.from_dict(block_data)
+                if block.hash != block_data.get('hash') or block.previous_hash != blockchain.get_last_block().hash:
+                    logging.warning(f"[Snapshot] Block {block_data.get('hash')} from {peer} does not extend the local tip.")
+                    return applied
+                status = blockchain.receive_block(block, None)
+                if status != blockchain.BLOCK_ACCEPTED:
+                    logging.warning(f"[Snapshot] Block {block.hash} from {peer} was {status}; stopping the replay.")
+                    return applied
+                applied += 1
+            if len(batch) < batch_size:
+                break
+        logging.info(f"[Snapshot] Replayed {applied} blocks from {peer}; tip is now {blockchain.get_height()}.")
+        return applied
+
+    def bootstrap(self, peer=None):
+        """Restore the newest snapshot (from `peer` if given, else disk) and replay the tail.
+
+        The tail is fetched from `peer`, or from the first known peer that answers.
+        """
+        candidates = [self.load_latest()]
+        if peer:
+            candidates.append(self.fetch_latest(peer))
+        candidates = [snapshot for snapshot in candidates if snapshot]
+        if candidates:
+            self.restore(max(candidates, key=lambda snapshot: snapshot['height']))
+        else:
+            logging.warning("[Snapshot] No snapshot available; replaying from genesis.")
+
+        for source in ([peer] if peer else self.blockchain.peer_nodes):
+            before = self.blockchain.get_height()
+            self.replay_tail(source)
+            if self.blockchain.get_height() > before:
+                break
+        return self.blockchain.get_height()
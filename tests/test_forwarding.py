@@ -0,0 +1,45 @@
+# tests/test_forwarding.py
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forwarding
+from block import Block
+
+
+class FakeBlockchain:
+    """Just enough of Blockchain for commit_batch on a node that leads."""
+
+    def __init__(self):
+        self.id = 'node_5000'
+        self.consensus = object()  # No clusters and no authorities: nothing to forward to
+        self.g, self.p = 5, 29
+        self.user_commitments = {}
+        self.user_db = {}
+        self.lock = threading.RLock()
+        self.committed = []
+
+    def add_block(self, user_id, transaction, commitment):
+        block = Block(user_id, 'parent', transaction, commitment, timestamp=1)
+        self.committed.append(block)
+        return block, self.id
+
+
+def test_bad_password_fails_only_its_own_item(monkeypatch):
+    monkeypatch.setattr(forwarding, 'disseminate_block', lambda *args: None)
+    blockchain = FakeBlockchain()
+    items = [{'kind': 'register', 'payload': {'userId': 'alice', 'hashedPassword': 7}},
+             {'kind': 'register', 'payload': {'userId': 'bob', 'hashedPassword': 'abc'}},
+             {'kind': 'register', 'payload': {'userId': 'carol', 'hashedPassword': None}},
+             {'kind': 'add_block', 'payload': {'user_id': 'dave', 'transaction': {'x': 1}, 'commitment': None}}]
+
+    results = forwarding.commit_batch(blockchain, items)
+
+    assert [status for _, status in results] == [200, 400, 400, 200]
+    assert results[1][0] == {"message": "Invalid input"}
+    assert len(blockchain.committed) == 1
+    assert [tx.get('user_id') for tx in blockchain.committed[0].get_transactions()] == ['alice', None]
+    assert set(blockchain.user_db) == {'alice'}
@@ -0,0 +1,112 @@
+# tracing.py
+
+import functools
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from config import TRACING_ENABLED, TRACE_BUFFER_SIZE
+
+TRACE_HEADER = 'X-Trace-Id'
+
+_local = threading.local()
+_spans = deque(maxlen=TRACE_BUFFER_SIZE)  # Oldest spans fall off once the buffer is full
+_process = {'pid': 0, 'name': 'node'}
+
+
+def set_process(pid, name):
+    """Identify this node in exported traces (Chrome groups events by pid)."""
+    _process['pid'] = pid
+    _process['name'] = name
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def current_trace_id():
+    return getattr(_local, 'trace_id', None)
+
+
+def set_trace_id(trace_id):
+    _local.trace_id = trace_id
+
+
+def outgoing_headers():
+    """Headers that carry the current trace to another node."""
+    trace_id = current_trace_id()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def record(name, start, duration, trace_id=None, **args):
+    if not TRACING_ENABLED:
+        return
+    _spans.append({
+        'name': name,
+        'ts': start * 1e6,
+        'dur': duration * 1e6,
+        'tid': threading.get_ident(),
+        'trace_id': trace_id or current_trace_id(),
+        'args': args,
+    })
+
+
+@contextmanager
+def span(name, **args):
+    """Time the enclosed block as a span of the current trace."""
+    if not TRACING_ENABLED:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(name, start, time.time() - start, **args)
+
+
+def traced(name):
+    """Decorator form of `span`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(func):
+    """Wrap `func` so it runs under the caller's trace id on another thread."""
+    trace_id = current_trace_id()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        set_trace_id(trace_id)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def buffered_spans():
+    return _spans
+
+
+def export_chrome(trace_id=None):
+    """Return recorded spans as Chrome trace-event JSON, optionally for one trace only."""
+    events = [{
+        'name': 'process_name', 'ph': 'M', 'pid': _process['pid'],
+        'args': {'name': _process['name']},
+    }]
+    for recorded in list(_spans):
+        if trace_id and recorded['trace_id'] != trace_id:
+            continue
+        events.append({
+            'name': recorded['name'],
+            'ph': 'X',
+            'ts': recorded['ts'],
+            'dur': recorded['dur'],
+            'pid': _process['pid'],
+            'tid': recorded['tid'],
+            'args': {**recorded['args'], 'trace_id': recorded['trace_id']},
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
@@ -0,0 +1,77 @@
+# tx_status.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config import TX_STATUS_CAPACITY
+
+PENDING = 'pending'
+COMMITTED = 'committed'
+REJECTED = 'rejected'
+
+
+class TxTracker:
+    """Status of asynchronously submitted transactions, for GET /tx/<id>.
+
+    Each submission gets an id when it is admitted. Its record moves from
+    pending to committed or rejected when the batch it rode in is answered.
+    Long-pollers wait on that record's own event, so a completion wakes only
+    the clients asking about it. Only the most recent TX_STATUS_CAPACITY
+    records are kept.
+    """
+
+    def __init__(self, capacity=TX_STATUS_CAPACITY):
+        self.capacity = capacity
+        self.records = OrderedDict()  # tx_id -> (record, done event)
+        self.lock = threading.Lock()
+
+    def create(self, kind):
+        tx_id = uuid.uuid4().hex
+        with self.lock:
+            record = {'tx_id': tx_id, 'kind': kind, 'status': PENDING, 'submitted_at': time.time()}
+            self.records[tx_id] = (record, threading.Event())
+            while len(self.records) > self.capacity:
+                self.records.popitem(last=False)
+        return tx_id
+
+    def complete(self, tx_id, result):
+        """Record the (body, status code) answer for a submission and wake its long-pollers."""
+        body, status_code = result
+        with self.lock:
+            entry = self.records.get(tx_id)
+            if entry is None:
+                return  # Evicted while pending
+            record, done = entry
+            record['finished_at'] = time.time()
+            if status_code == 200:
+                record['status'] = COMMITTED
+                record['block_hash'] = (body.get('block') or {}).get('hash')
+                record['merkle_tx_ids'] = body.get('tx_ids', [])
+            else:
+                record['status'] = REJECTED
+                record['error'] = body.get('message')
+                record['code'] = status_code
+        done.set()
+
+    def callback(self, tx_id):
+        return lambda result: self.complete(tx_id, result)
+
+    def get(self, tx_id, wait=0):
+        """A copy of the record, waiting up to `wait` seconds for it to leave pending. None if unknown."""
+        with self.lock:
+            entry = self.records.get(tx_id)
+        if entry is None:
+            return None
+        record, done = entry
+        if wait > 0:
+            done.wait(wait)
+        with self.lock:
+            return dict(record)
+
+    def stats(self):
+        with self.lock:
+            counts = {PENDING: 0, COMMITTED: 0, REJECTED: 0}
+            for record, _ in self.records.values():
+                counts[record['status']] += 1
+        return counts
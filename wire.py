@@ -0,0 +1,134 @@
+# wire.py
+
+import json
+import logging
+import threading
+import zlib
+from flask import Response
+import peer_health
+import tracing
+from config import WIRE_COMPRESS_THRESHOLD
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; nodes without it simply stay on JSON
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+
+# Peers that have answered us in msgpack. Anything else (unknown peers, older
+# nodes) is sent JSON, so mixed-version networks keep working.
+_binary_peers = set()
+
+# Outgoing inter-node traffic, reported under /metrics for benchmarking
+_stats = {'messages_sent': 0, 'bytes_sent': 0, 'bytes_received': 0}
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(sent, received):
+    with _stats_lock:
+        _stats['messages_sent'] += 1
+        _stats['bytes_sent'] += sent
+        _stats['bytes_received'] += received
+
+
+def supported_types():
+    return [MSGPACK, JSON] if msgpack else [JSON]
+
+
+def accept_header():
+    return ', '.join(supported_types())
+
+
+def encode(payload, content_type, compress=True):
+    """Serialize `payload`. Returns (body, headers)."""
+    if content_type == MSGPACK:
+        body = msgpack.packb(payload, use_bin_type=True)
+    else:
+        body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': content_type}
+    if compress and len(body) >= WIRE_COMPRESS_THRESHOLD:
+        body = zlib.compress(body)
+        headers['Content-Encoding'] = 'deflate'
+    return body, headers
+
+
+def decode(body, content_type, content_encoding=None):
+    if content_encoding == 'deflate':
+        body = zlib.decompress(body)
+    if content_type and content_type.split(';')[0].strip() == MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack payload received but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    return json.loads(body) if body else None
+
+
+def is_supported(content_type):
+    return not content_type or content_type.split(';')[0].strip() in supported_types()
+
+
+# --- Server side -------------------------------------------------------------
+
+def read_request(flask_request):
+    """Decode an incoming Flask request body in whichever format it was sent."""
+    return decode(
+        flask_request.get_data(),
+        flask_request.headers.get('Content-Type'),
+        flask_request.headers.get('Content-Encoding'),
+    )
+
+
+def make_response(payload, status, flask_request):
+    """Build a response in the best format the caller accepts."""
+    accepted = flask_request.headers.get('Accept', '')
+    content_type = MSGPACK if msgpack and MSGPACK in accepted else JSON
+    compress = 'deflate' in flask_request.headers.get('Accept-Encoding', '')
+    body, headers = encode(payload, content_type, compress=compress)
+    return Response(body, status=status, headers=headers)
+
+
+# --- Client side -------------------------------------------------------------
+
+def read_response(peer, response):
+    """Decode a peer's response and remember whether it speaks msgpack.
+
+    requests already undoes Content-Encoding on responses.
+    """
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.split(';')[0].strip() == MSGPACK:
+        _binary_peers.add(peer)
+    return decode(response.content, content_type)
+
+
+def post(peer, path, payload, timeout=None, headers=None, content_type=None):
+    """POST `payload` to `peer` using the most compact format it is known to accept.
+
+    Without an explicit `timeout` the peer's adaptive deadline is used.
+    `content_type` forces a format, for endpoints outside WIRE_ENDPOINTS that
+    only read JSON.
+    """
+    content_type = content_type or (MSGPACK if msgpack and peer in _binary_peers else JSON)
+    body, encoding_headers = encode(payload, content_type, compress=content_type == MSGPACK)
+    request_headers = {**(headers or {}), **tracing.outgoing_headers(), **encoding_headers, 'Accept': accept_header()}
+    response = peer_health.tracked_request('POST', peer, f'http://{peer}{path}', timeout=timeout,
+                                           data=body, headers=request_headers)
+    _count(len(body), len(response.content))
+    if response.status_code == 415 and content_type != JSON:
+        logging.info(f"[Wire] {peer} rejected {content_type}; falling back to JSON.")
+        _binary_peers.discard(peer)
+        return post(peer, path, payload, timeout, headers, JSON)
+    return response
+
+
+def get(peer, path, timeout=None, params=None):
+    """GET from `peer`, advertising the formats this node can decode."""
+    response = peer_health.tracked_request('GET', peer, f'http://{peer}{path}', timeout=timeout,
+                                           params=params, headers={**tracing.outgoing_headers(), 'Accept': accept_header()})
+    _count(0, len(response.content))
+    return response
@@ -1,4 +1,4 @@
-import random
+import determinism
 from config import P, G, SECRET_KEY
 import jwt
 import datetime
@@ -12,7 +12,7 @@ def verify_proof(s, T, C, c, p=29, g=5):
     return left_hand_side == right_hand_side
 
 def challenge_verifier(q):
-    return random.randint(1, q - 1)
+    return determinism.node_rng('challenge').randint(1, q - 1)
 
 def issue_token(user_id, node_id):
     token = {